@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from cart.models import Cart
+
+
+class Command(BaseCommand):
+    help = ('Delete expired database sessions, and anonymous carts older than the session '
+            'cookie age, in small batches so the writes never hold the database lock for long.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        sessions = self.purge(
+            Session.objects.filter(expire_date__lt=now), 'session_key', options['batch_size'])
+        # once its session cookie has expired an anonymous cart is unreachable
+        cutoff = now - timedelta(seconds=settings.SESSION_COOKIE_AGE)
+        carts = self.purge(
+            Cart.objects.filter(user=None, created_at__lt=cutoff), 'id', options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {sessions} expired session(s) and {carts} abandoned cart(s).'))
+
+    def purge(self, queryset, key, batch_size):
+        deleted = 0
+        while True:
+            keys = list(queryset.values_list(key, flat=True)[:batch_size])
+            if not keys:
+                return deleted
+            with transaction.atomic():
+                queryset.model.objects.filter(**{f'{key}__in': keys}).delete()
+            deleted += len(keys)
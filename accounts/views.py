@@ -4,6 +4,11 @@ from .forms import CustomUserCreationForm, CustomErrorList
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.db.models import Count, Prefetch, Sum
+from cart.models import Order, Item
+from movies.pagination import keyset_page
+
+ORDERS_PAGE_SIZE = 10
 
 @login_required
 def logout(request):
@@ -42,8 +47,20 @@ def signup(request):
         
 @login_required
 def orders(request):
+    # newest first, each order with its line summary and items (plus their
+    # movies) loaded in one extra query for the whole page
+    orders = Order.objects.filter(user=request.user).annotate(
+        line_count=Count('item'),
+        movie_count=Sum('item__quantity'),
+    ).prefetch_related(
+        Prefetch('item_set', queryset=Item.objects.select_related('movie'))
+    )
+    orders, next_cursor = keyset_page(orders, ['-date', '-id'],
+                                      request.GET.get('cursor'), ORDERS_PAGE_SIZE)
+
     template_data = {}
     template_data['title'] = 'Orders'
-    template_data['orders'] = request.user.order_set.all()
+    template_data['orders'] = orders
+    template_data['next_cursor'] = next_cursor
     return render(request, 'accounts/orders.html',
         {'template_data': template_data})
\ No newline at end of file
@@ -1,5 +1,32 @@
 from django.contrib import admin
+from .exports import EXPORTS, FORMATS, export_response
 from .models import Order, Item
 
-admin.site.register(Order)
-admin.site.register(Item)
\ No newline at end of file
+
+def export_action(name, fmt):
+    def action(modeladmin, request, queryset):
+        return export_response(request, name, fmt, queryset)
+    action.__name__ = f'export_{name}_{fmt}'
+    action.short_description = f'Export {name} of selected orders as {fmt.upper()}'
+    action.allowed_permissions = ('view',)
+    return action
+
+
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'date', 'total')
+    list_filter = ('date',)
+    search_fields = ('user__username',)
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    # "select all" hands the actions the whole filtered queryset, which they stream
+    actions = [export_action(name, fmt) for name in EXPORTS for fmt in FORMATS]
+
+
+class ItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'order', 'movie', 'price', 'quantity')
+    list_select_related = ('order__user', 'movie')
+    raw_id_fields = ('order', 'movie')
+
+
+admin.site.register(Order, OrderAdmin)
+admin.site.register(Item, ItemAdmin)
@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from cart.models import Cart, CartLine
+from cart.utils import MAX_QUANTITY, place_order
+from movies.models import Movie
+from moviesstore.benchmarks import format_summary, scratch_database, summarize, timed
+
+
+class Command(BaseCommand):
+    help = 'Measure checkout latency and query count as the cart grows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 5, 10, 30, 60, 120])
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            user = User.objects.create_user('benchmark')
+            movies = Movie.objects.bulk_create([
+                Movie(name=f'Movie {i}', price=i % 20 + 1, description='', image='movie_images/avatar.jpeg')
+                for i in range(max(options['sizes']))
+            ])
+
+            cart = Cart.objects.create(user=user)
+
+            def fill_cart(size):
+                CartLine.objects.bulk_create([
+                    CartLine(cart=cart, movie=movie, quantity=i % MAX_QUANTITY + 1)
+                    for i, movie in enumerate(movies[:size])
+                ])
+
+            for size in options['sizes']:
+                fill_cart(size)
+                with CaptureQueriesContext(connection) as queries:
+                    place_order(user)
+                samples = []
+                for _ in range(options['repeat']):
+                    fill_cart(size)
+                    samples.append(timed(place_order, user)[0])
+                label = f'{size:>4} lines, {len(queries.captured_queries)} queries'
+                self.stdout.write(format_summary(label, summarize(samples)))
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+
+from movies.models import Movie
+from moviesstore.benchmarks import format_summary, scratch_database, summarize
+
+ENGINES = [
+    'django.contrib.sessions.backends.db',
+    'moviesstore.sessions',
+]
+
+SESSION_WRITES = ('INSERT INTO "django_session"', 'UPDATE "django_session"', 'DELETE FROM "django_session"')
+
+
+class Command(BaseCommand):
+    help = ('Drive concurrent anonymous shoppers through the cart endpoints on a throwaway '
+            'on-disk SQLite database and compare session writes per session engine.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--rounds', type=int, default=25,
+                            help='Movie page view + cart add + cart view cycles per shopper.')
+        parser.add_argument('--engines', nargs='+', default=ENGINES)
+
+    def handle(self, *args, **options):
+        with scratch_database(on_disk=True):
+            movies = Movie.objects.bulk_create([
+                Movie(name=f'Movie {i}', price=10, description='', image='movie_images/avatar.jpeg')
+                for i in range(50)
+            ])
+            self.movie_ids = [movie.id for movie in movies]
+            for engine in options['engines']:
+                with override_settings(SESSION_ENGINE=engine):
+                    self.run_engine(engine, options['threads'], options['rounds'])
+
+    def run_engine(self, engine, threads, rounds):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.session_writes = 0
+        self.errors = 0
+
+        workers = [threading.Thread(target=self.shopper, args=(n, rounds)) for n in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(engine)
+        self.stdout.write(f'  {len(self.latencies)} requests in {elapsed:.2f}s, '
+                          f'{self.session_writes} django_session writes, {self.errors} errors')
+        self.stdout.write('  ' + format_summary('latency', summarize(self.latencies)))
+
+    def shopper(self, number, rounds):
+        client = Client(raise_request_exception=False)
+        writes = 0
+        latencies = []
+        errors = 0
+
+        def count_session_writes(execute, sql, params, many, context):
+            nonlocal writes
+            if sql.startswith(SESSION_WRITES):
+                writes += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_session_writes):
+            for i in range(rounds):
+                movie_id = self.movie_ids[(number * rounds + i) % len(self.movie_ids)]
+                for method, path, data in [
+                    ('get', f'/movies/{movie_id}/', None),
+                    ('post', f'/cart/{movie_id}/add/', {'quantity': '1'}),
+                    ('get', '/cart/', None),
+                ]:
+                    start = time.perf_counter()
+                    response = getattr(client, method)(path, data)
+                    latencies.append(time.perf_counter() - start)
+                    if response.status_code >= 500:
+                        errors += 1
+        connection.close()
+
+        with self.lock:
+            self.latencies += latencies
+            self.session_writes += writes
+            self.errors += errors
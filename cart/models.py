@@ -10,7 +10,13 @@ class Order(models.Model):
         on_delete=models.CASCADE)
     def __str__(self):
         return str(self.id) + ' - ' + self.user.username
-    
+
+    class Meta:
+        indexes = [
+            # backs the newest-first order history of a user
+            models.Index(fields=['user', 'date', 'id']),
+        ]
+
 class Item(models.Model):
     id = models.AutoField(primary_key=True)
     price = models.IntegerField()
@@ -20,4 +26,28 @@ class Item(models.Model):
     movie = models.ForeignKey(Movie,
         on_delete=models.CASCADE)
     def __str__(self):
-        return str(self.id) + ' - ' + self.movie.name
\ No newline at end of file
+        return str(self.id) + ' - ' + self.movie.name
+
+class Cart(models.Model):
+    """A shopping cart. Anonymous carts have no user; the session holds their id
+    until login, when they are merged into the user's cart."""
+    id = models.AutoField(primary_key=True)
+    user = models.OneToOneField(User, null=True, blank=True,
+        on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    def __str__(self):
+        owner = self.user.username if self.user else 'anonymous'
+        return str(self.id) + ' - ' + owner
+
+class CartLine(models.Model):
+    id = models.AutoField(primary_key=True)
+    quantity = models.PositiveIntegerField()
+    cart = models.ForeignKey(Cart, related_name='lines',
+        on_delete=models.CASCADE)
+    movie = models.ForeignKey(Movie,
+        on_delete=models.CASCADE)
+    def __str__(self):
+        return str(self.id) + ' - ' + self.movie.name
+
+    class Meta:
+        unique_together = ('cart', 'movie')
@@ -0,0 +1,17 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .models import Cart
+from .utils import CART_SESSION_KEY, merge_carts
+
+
+@receiver(user_logged_in)
+def merge_anonymous_cart(sender, request, user, **kwargs):
+    if request is None or not hasattr(request, 'session'):
+        return
+    cart_id = request.session.pop(CART_SESSION_KEY, None)
+    if cart_id is None:
+        return
+    anonymous_cart = Cart.objects.filter(id=cart_id, user=None).first()
+    if anonymous_cart is not None:
+        merge_carts(anonymous_cart, user)
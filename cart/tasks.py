@@ -0,0 +1,17 @@
+"""Slow side effects of checkout, run by the task queue."""
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+
+from tasks.queue import task
+from .models import Item, Order
+
+
+@task
+def send_order_confirmation(order_id):
+    """Email a customer the summary of their order."""
+    order = Order.objects.select_related('user').filter(id=order_id).first()
+    if order is None or not order.user.email:
+        return
+    items = Item.objects.filter(order=order).select_related('movie').order_by('id')
+    body = render_to_string('cart/emails/order_confirmation.txt', {'order': order, 'items': items})
+    send_mail(f'Your MoviesStore order #{order.id}', body, None, [order.user.email])
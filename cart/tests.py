@@ -1,3 +1,39 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from movies.models import Movie
+from .exports import csv_blocks
+from .models import Cart, CartLine
+
+
+class CsvExportTests(TestCase):
+    def test_formulas_are_escaped(self):
+        rows = [(1, '=HYPERLINK("http://example.com")', '-2+3', '@SUM(A1)', 'Heat', -4)]
+        text = ''.join(csv_blocks(['id', 'a', 'b', 'c', 'movie', 'total'], rows))
+        self.assertEqual(text.splitlines()[1],
+                         '1,"\'=HYPERLINK(""http://example.com"")",\'-2+3,\'@SUM(A1),Heat,-4')
+
+
+class MergeCartTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='buyer-password')
+        self.heat, self.ronin, self.alien = [
+            Movie.objects.create(name=name, price=5, description='A movie.')
+            for name in ('Heat', 'Ronin', 'Alien')
+        ]
+        saved = Cart.objects.create(user=self.user)
+        CartLine.objects.create(cart=saved, movie=self.heat, quantity=5)
+        CartLine.objects.create(cart=saved, movie=self.alien, quantity=3)
+
+    def test_login_merges_the_anonymous_cart(self):
+        self.client.post(f'/cart/{self.heat.id}/add/', {'quantity': 2})
+        self.client.post(f'/cart/{self.ronin.id}/add/', {'quantity': 1})
+        self.client.post('/accounts/login/', {'username': 'buyer', 'password': 'buyer-password'})
+
+        lines = CartLine.objects.filter(cart__user=self.user)
+        # the anonymous quantities win
+        self.assertEqual(
+            {line.movie.name: line.quantity for line in lines.select_related('movie')},
+            {'Heat': 2, 'Ronin': 1, 'Alien': 3},
+        )
+        self.assertEqual(Cart.objects.count(), 1)
@@ -1,6 +1,91 @@
-def calculate_cart_total(cart, movies_in_cart):
+from movies.rollups import record_sales
+from moviesstore.db import atomic_with_retry
+from tasks.queue import enqueue
+from .tasks import send_order_confirmation
+from .models import Order, Item, Cart, CartLine
+
+# matches the max of the quantity input on the movie page
+MAX_QUANTITY = 10
+
+# session key holding the id of an anonymous visitor's cart
+CART_SESSION_KEY = 'cart_id'
+
+def calculate_cart_total(cart_lines):
     total = 0
-    for movie in movies_in_cart:
-        quantity = cart[str(movie.id)]
-        total += movie.price * int(quantity)
-    return total
\ No newline at end of file
+    for line in cart_lines:
+        total += line.movie.price * line.quantity
+    return total
+
+def parse_quantity(value):
+    """Return value as an int between 1 and MAX_QUANTITY, or None if it is not one."""
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        return None
+    if 1 <= quantity <= MAX_QUANTITY:
+        return quantity
+    return None
+
+def get_cart(request):
+    """The visitor's cart, created on first use.
+
+    Only creating an anonymous cart writes to the session; later line
+    changes touch just their own CartLine row.
+    """
+    if request.user.is_authenticated:
+        cart, created = Cart.objects.get_or_create(user=request.user)
+        return cart
+    cart_id = request.session.get(CART_SESSION_KEY)
+    if cart_id is not None:
+        cart = Cart.objects.filter(id=cart_id, user=None).first()
+        if cart is not None:
+            return cart
+    cart = Cart.objects.create()
+    request.session[CART_SESSION_KEY] = cart.id
+    return cart
+
+def get_cart_lines(request):
+    """The visitor's cart lines with their movies, without loading the cart itself."""
+    if request.user.is_authenticated:
+        lines = CartLine.objects.filter(cart__user=request.user)
+    else:
+        cart_id = request.session.get(CART_SESSION_KEY)
+        if cart_id is None:
+            return CartLine.objects.none()
+        lines = CartLine.objects.filter(cart_id=cart_id, cart__user=None)
+    return lines.select_related('movie').order_by('id')
+
+@atomic_with_retry
+def set_line_quantity(cart, movie, quantity):
+    CartLine.objects.update_or_create(cart=cart, movie=movie, defaults={'quantity': quantity})
+
+@atomic_with_retry
+def merge_carts(anonymous_cart, user):
+    """Fold an anonymous cart into the user's cart, the anonymous quantities winning."""
+    cart, created = Cart.objects.get_or_create(user=user)
+    movie_ids = anonymous_cart.lines.values('movie_id')
+    cart.lines.filter(movie_id__in=movie_ids).delete()
+    anonymous_cart.lines.update(cart=cart)
+    anonymous_cart.delete()
+
+@atomic_with_retry
+def place_order(user):
+    """Turn the user's cart into an Order and its Items in one transaction.
+
+    Lines and prices come from a single joined fetch and every Item is
+    written with one bulk INSERT, so the cost of checkout does not grow
+    with the number of lines. Raises ValueError for an empty cart.
+    """
+    lines = list(CartLine.objects.filter(cart__user=user).select_related('movie'))
+    if not lines:
+        raise ValueError('The cart is empty.')
+
+    order = Order.objects.create(user=user, total=calculate_cart_total(lines))
+    items = Item.objects.bulk_create([
+        Item(order=order, movie=line.movie, price=line.movie.price, quantity=line.quantity)
+        for line in lines
+    ])
+    record_sales(order, items)
+    enqueue(send_order_confirmation, [order.id])
+    CartLine.objects.filter(id__in=[line.id for line in lines]).delete()
+    return order
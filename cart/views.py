@@ -1,62 +1,40 @@
 from django.shortcuts import render
 from django.shortcuts import get_object_or_404, redirect
 from movies.models import Movie
-from .utils import calculate_cart_total
-from .models import Order, Item
+from .utils import (
+    calculate_cart_total, get_cart, get_cart_lines, parse_quantity, place_order, set_line_quantity,
+)
 from django.contrib.auth.decorators import login_required
 
 def index(request):
-    cart_total = 0
-    movies_in_cart = []
-    cart = request.session.get('cart', {})
-    movie_ids = list(cart.keys())
-    if (movie_ids != []):
-        movies_in_cart = Movie.objects.filter(id__in=movie_ids)
-        cart_total = calculate_cart_total(cart, movies_in_cart)
+    cart_lines = list(get_cart_lines(request))
 
     template_data = {}
     template_data['title'] = 'Cart'
-    template_data['movies_in_cart'] = movies_in_cart
-    template_data['cart_total'] = cart_total
+    template_data['cart_lines'] = cart_lines
+    template_data['cart_total'] = calculate_cart_total(cart_lines)
     return render(request, 'cart/index.html', {'template_data': template_data})
 
 def add(request, id):
-    get_object_or_404(Movie, id=id)
-    cart = request.session.get('cart', {})
-    cart[id] = request.POST['quantity']
-    request.session['cart'] = cart
+    movie = get_object_or_404(Movie, id=id)
+    quantity = parse_quantity(request.POST.get('quantity'))
+    if quantity is None:
+        return redirect('movies.show', id=id)
+    set_line_quantity(get_cart(request), movie, quantity)
     return redirect('cart.index')
 
 def clear(request):
-    request.session['cart'] = {}
+    get_cart_lines(request).delete()
     return redirect('cart.index')
 
 @login_required
 def purchase(request):
-    cart = request.session.get('cart', {})
-    movie_ids = list(cart.keys())
-
-    if (movie_ids == []):
+    try:
+        order = place_order(request.user)
+    except ValueError:
         return redirect('cart.index')
-    
-    movies_in_cart = Movie.objects.filter(id__in=movie_ids)
-    cart_total = calculate_cart_total(cart, movies_in_cart)
-
-    order = Order()
-    order.user = request.user
-    order.total = cart_total
-    order.save()
-
-    for movie in movies_in_cart:
-        item = Item()
-        item.movie = movie
-        item.price = movie.price
-        item.order = order
-        item.quantity = cart[str(movie.id)]
-        item.save()
 
-    request.session['cart'] = {}
     template_data = {}
     template_data['title'] = 'Purchase confirmation'
     template_data['order_id'] = order.id
-    return render(request, 'cart/purchase.html', {'template_data': template_data})
\ No newline at end of file
+    return render(request, 'cart/purchase.html', {'template_data': template_data})
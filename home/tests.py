@@ -0,0 +1,20 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from movies.models import Movie, Review
+
+
+class IndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        movie = Movie.objects.create(name='Heat', price=10, description='', image='movie_images/heat.jpg')
+        user = User.objects.create_user('reviewer')
+        Review.objects.create(movie=movie, user=user, comment='Great')
+
+    def test_trending_heading_follows_the_setting(self):
+        self.assertContains(self.client.get(reverse('home.index')), 'Trending this week')
+        cache.clear()
+        with override_settings(TRENDING_DAYS=3):
+            self.assertContains(self.client.get(reverse('home.index')), 'Trending over the last 3 days')
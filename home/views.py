@@ -1,7 +1,17 @@
+from django.conf import settings
 from django.shortcuts import render
+from movies.rollups import home_rankings
+from moviesstore.cache import cache_anonymous
+@cache_anonymous('catalog')
 def index(request):
     template_data = {}
     template_data['title'] = 'Movies Store'
+    rankings = home_rankings()
+    template_data['trending_days'] = settings.TRENDING_DAYS
+    template_data['rankings'] = [
+        ('best_sellers', rankings['best_sellers']),
+        ('trending', rankings['trending']),
+    ]
     return render(request, 'home/index.html', {
         'template_data': template_data})
 def about(request):
@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import Movie, Review, Report, MoviePetition, PetitionVote
+from django.db.models import Count, F, Q
+from moviesstore.cache import bump
+from tasks.queue import enqueue
+from .rollups import review_cells
+from .tasks import refresh_review_stats
+from .models import Movie, Review, Report, ReportedReview, MoviePetition, PetitionVote
 
 
 class MovieAdmin(admin.ModelAdmin):
@@ -11,21 +16,67 @@ class ReviewAdmin(admin.ModelAdmin):
     list_display = ('id', 'movie', 'user', 'date', 'is_active', 'report_count')
     list_filter = ('is_active', 'date')
     search_fields = ('user__username', 'comment')
+    list_select_related = ('movie', 'user')
     actions = ['hide_reviews', 'reinstate_reviews']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(report_total=Count('reports'))
+
     def report_count(self, obj):
-        return obj.reports.count()
+        return obj.report_total
+    report_count.admin_order_field = 'report_total'
 
     def hide_reviews(self, request, queryset):
-        queryset.update(is_active=False)
+        self.update_reviews(queryset, is_active=False)
 
     def reinstate_reviews(self, request, queryset):
-        queryset.update(is_active=True)
+        self.update_reviews(queryset, is_active=True)
+
+    def update_reviews(self, queryset, **changes):
+        # read the affected rows first: on a changelist filtered on the
+        # changed field the queryset is empty once updated
+        movie_ids = list(queryset.values_list('movie_id', flat=True).distinct())
+        cells = [[movie_id, day.isoformat()] for movie_id, day in review_cells(queryset)]
+        queryset.update(**changes)
+        # bulk updates skip the post_save receivers
+        bump(*[f'movie:{movie_id}' for movie_id in movie_ids])
+        # recounting every day of a large selection is left to a worker
+        if cells:
+            enqueue(refresh_review_stats, [cells])
+
+
+class ModerationQueueAdmin(ReviewAdmin):
+    list_display = ('id', 'movie', 'user', 'comment', 'date', 'is_active', 'open_reports', 'report_count')
+    list_filter = ('is_active',)
+    ordering = ('-date',)
+    actions = ['hide_reviews', 'reinstate_reviews', 'resolve_reports']
+
+    def get_queryset(self, request):
+        # driven by the (resolved, review) index on Report rather than a
+        # scan of every review
+        reported = Report.objects.filter(resolved=False).values('review_id')
+        return super().get_queryset(request).filter(id__in=reported).annotate(
+            open_total=Count('reports', filter=Q(reports__resolved=False))
+        )
+
+    def open_reports(self, obj):
+        return obj.open_total
+    open_reports.admin_order_field = 'open_total'
+    open_reports.short_description = 'Open reports'
+
+    def resolve_reports(self, request, queryset):
+        Report.objects.filter(review__in=queryset, resolved=False).update(resolved=True)
+    resolve_reports.short_description = 'Resolve reports on selected reviews'
+
+    def has_add_permission(self, request):
+        return False
 
 
 class ReportAdmin(admin.ModelAdmin):
     list_display = ('id', 'review', 'reporter', 'created_at', 'resolved')
     list_filter = ('resolved', 'created_at')
+    list_select_related = ('review', 'reporter')
+    raw_id_fields = ('review', 'reporter')
     search_fields = ('reporter__username', 'review__comment')
 
 
@@ -33,33 +84,49 @@ class MoviePetitionAdmin(admin.ModelAdmin):
     list_display = ('id', 'title', 'petitioner', 'created_at', 'is_active', 'admin_reviewed', 'vote_count')
     list_filter = ('is_active', 'admin_reviewed', 'created_at')
     search_fields = ('title', 'petitioner__username', 'description')
+    list_select_related = ('petitioner',)
     actions = ['mark_reviewed', 'activate_petitions', 'deactivate_petitions']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(net_votes=F('upvotes') - F('downvotes'))
+
     def vote_count(self, obj):
-        return obj.get_vote_count()
+        return obj.net_votes
     vote_count.short_description = 'Net Votes'
+    vote_count.admin_order_field = 'net_votes'
 
     def mark_reviewed(self, request, queryset):
-        queryset.update(admin_reviewed=True)
+        self.update_petitions(queryset, admin_reviewed=True)
     mark_reviewed.short_description = 'Mark selected petitions as reviewed'
 
     def activate_petitions(self, request, queryset):
-        queryset.update(is_active=True)
+        self.update_petitions(queryset, is_active=True)
     activate_petitions.short_description = 'Activate selected petitions'
 
     def deactivate_petitions(self, request, queryset):
-        queryset.update(is_active=False)
+        self.update_petitions(queryset, is_active=False)
     deactivate_petitions.short_description = 'Deactivate selected petitions'
 
+    def update_petitions(self, queryset, **changes):
+        # read the affected rows first: on a changelist filtered on the
+        # changed field the queryset is empty once updated
+        petition_ids = list(queryset.values_list('id', flat=True))
+        queryset.update(**changes)
+        # bulk updates skip the post_save receivers
+        bump('petitions', *[f'petition:{petition_id}' for petition_id in petition_ids])
+
 
 class PetitionVoteAdmin(admin.ModelAdmin):
     list_display = ('id', 'petition', 'voter', 'vote_type', 'created_at')
     list_filter = ('vote_type', 'created_at')
+    list_select_related = ('petition__petitioner', 'voter')
+    raw_id_fields = ('petition', 'voter')
     search_fields = ('petition__title', 'voter__username')
 
 
 admin.site.register(Movie, MovieAdmin)
 admin.site.register(Review, ReviewAdmin)
+admin.site.register(ReportedReview, ModerationQueueAdmin)
 admin.site.register(Report, ReportAdmin)
 admin.site.register(MoviePetition, MoviePetitionAdmin)
 admin.site.register(PetitionVote, PetitionVoteAdmin)
\ No newline at end of file
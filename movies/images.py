@@ -0,0 +1,90 @@
+"""Resized poster derivatives for responsive ``srcset`` images.
+
+Every poster gets a WebP and a JPEG copy at each width in
+``settings.MOVIE_THUMBNAIL_WIDTHS`` (never upscaled), stored next to the
+original under ``movie_images/thumbs/``. Files already on disk are never
+regenerated, and which widths exist for a poster is remembered in the cache
+so templates don't stat the filesystem on every render. ``generate_thumbnails``
+forgets it once it has written files; with a cache shared between processes
+(MOVIESSTORE_CACHE) that reaches the web servers from the task worker too,
+and otherwise the entry runs out after MOVIE_THUMBNAIL_CACHE_TIMEOUT.
+"""
+import io
+import posixpath
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+THUMBNAIL_DIR = 'movie_images/thumbs'
+
+# format -> (file extension, Pillow save options)
+FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def thumbnail_name(image_name, width, fmt):
+    stem = posixpath.splitext(posixpath.basename(image_name))[0]
+    return f'{THUMBNAIL_DIR}/{stem}-{width}.{FORMATS[fmt][0]}'
+
+
+def _cache_key(image_name):
+    return f'thumbnails:{image_name}'
+
+
+def generate_thumbnails(image_name, force=False):
+    """Write any missing derivatives of ``image_name`` and return how many were written."""
+    if not image_name:
+        return 0
+    written = 0
+    with default_storage.open(image_name) as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image = image.convert('RGB')
+
+        for width in settings.MOVIE_THUMBNAIL_WIDTHS:
+            if width > image.width:
+                continue
+            resized = None
+            for fmt, (_, options) in FORMATS.items():
+                name = thumbnail_name(image_name, width, fmt)
+                if not force and default_storage.exists(name):
+                    continue
+                if resized is None:
+                    height = round(image.height * width / image.width)
+                    resized = image.resize((width, height), Image.LANCZOS)
+                buffer = io.BytesIO()
+                resized.save(buffer, **options)
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+                written += 1
+
+    cache.delete(_cache_key(image_name))
+    return written
+
+
+def available_widths(image_name):
+    """Widths for which both derivatives of ``image_name`` exist."""
+    key = _cache_key(image_name)
+    widths = cache.get(key)
+    if widths is None:
+        widths = [
+            width for width in settings.MOVIE_THUMBNAIL_WIDTHS
+            if all(default_storage.exists(thumbnail_name(image_name, width, fmt)) for fmt in FORMATS)
+        ]
+        # posters whose derivatives are still queued are looked up again
+        if widths:
+            cache.set(key, widths, settings.MOVIE_THUMBNAIL_CACHE_TIMEOUT)
+    return widths
+
+
+def srcset(image_name, fmt):
+    """The ``srcset`` attribute value for one format, or '' if nothing is generated."""
+    return ', '.join(
+        f'{default_storage.url(thumbnail_name(image_name, width, fmt))} {width}w'
+        for width in available_widths(image_name)
+    )
@@ -0,0 +1,68 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from movies.models import Movie
+from movies.pagination import keyset_page
+from movies.search import search_page
+from moviesstore.benchmarks import format_summary, scratch_database, summarize, timed
+
+SYLLABLES = [
+    'ka', 'ri', 'mon', 'da', 'lex', 'tor', 'vi', 'nal', 'sha', 'dow', 'ber', 'qui', 'zen', 'lo', 'ra',
+    'sto', 'ne', 'gal', 'ax', 'pha', 'the', 'mar', 'tin', 'el', 'ost', 'ur', 'fen', 'wi', 'cor', 'ly',
+]
+
+
+def vocabulary(rng, size=5000):
+    """A deterministic made-up vocabulary, large enough that terms are selective."""
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = 'Compare FTS5 movie search against the substring fallback on a synthetic catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.words = vocabulary(rng)
+        with scratch_database():
+            self.seed_movies(rng, options['rows'])
+            terms = [self.random_term(rng) for _ in range(options['queries'])]
+
+            fts = [timed(search_page, term, None, 24)[0] for term in terms]
+            fallback = [timed(self.substring_page, term)[0] for term in terms]
+
+            self.stdout.write(f"{options['rows']} movies on {connection.vendor}")
+            self.stdout.write(format_summary('fts5 search', summarize(fts)))
+            self.stdout.write(format_summary('icontains scan', summarize(fallback)))
+
+    def seed_movies(self, rng, rows, batch_size=5000):
+        for start in range(0, rows, batch_size):
+            Movie.objects.bulk_create([
+                Movie(
+                    name=' '.join(rng.choice(self.words) for _ in range(rng.randint(1, 4))).title(),
+                    price=rng.randint(1, 30),
+                    description=' '.join(rng.choice(self.words) for _ in range(rng.randint(10, 40))),
+                    image='movie_images/avatar.jpeg',
+                )
+                for _ in range(min(batch_size, rows - start))
+            ])
+
+    def random_term(self, rng):
+        words = rng.sample(self.words, rng.randint(1, 2))
+        # truncate the last word to exercise prefix matching
+        words[-1] = words[-1][:rng.randint(3, len(words[-1]))]
+        return ' '.join(words)
+
+    def substring_page(self, term):
+        movies = Movie.objects.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return keyset_page(movies, ['name', 'id'], None, 24)
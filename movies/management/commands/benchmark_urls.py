@@ -0,0 +1,379 @@
+import io
+import itertools
+import json
+import platform
+import re
+import resource
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from cart.models import Cart, CartLine, Order
+from movies.models import Movie, MoviePetition, PetitionVote, Review
+from moviesstore.benchmarks import percentile, quiet_loggers, scratch_database, unthrottled
+
+# rows seeded at --scale 1
+DATASET = {
+    'movies': 1000,
+    'users': 200,
+    'reviews': 10_000,
+    'reports': 100,
+    'petitions': 500,
+    'votes': 20_000,
+    'orders': 2000,
+}
+
+# a route only regresses by getting this much slower, however small its p50
+MIN_REGRESSION_MS = 2.0
+
+SERVER_TIMING = re.compile(
+    r'db;dur=(?P<db>[\d.]+);desc="(?P<queries>\d+) queries, (?P<duplicates>\d+) duplicates", '
+    r'tpl;dur=(?P<templates>[\d.]+)'
+)
+
+def iter_routes(resolver=None, prefix='', namespace=''):
+    """Yield ``(name, route)`` for every pattern under ``resolver``.
+
+    Unnamed patterns are named after their route.
+    """
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            inner = namespace
+            if pattern.namespace:
+                inner = f'{namespace}{pattern.namespace}:'
+            yield from iter_routes(pattern, route, inner)
+        elif isinstance(pattern, URLPattern):
+            yield (f'{namespace}{pattern.name}' if pattern.name else route), route
+
+
+class Case:
+    """A request to one route, sent ``--repeat`` times.
+
+    ``prepare``, if given, runs untimed before every request and returns
+    a dict that may replace ``kwargs`` and ``data`` for it.
+    """
+
+    def __init__(self, route, who, method='GET', kwargs=None, data=None, query='', prepare=None):
+        self.route = route
+        self.who = who
+        self.method = method
+        self.kwargs = kwargs or {}
+        self.data = data or {}
+        self.query = query
+        self.prepare = prepare
+
+    @property
+    def label(self):
+        return ' '.join(filter(None, [self.route, self.method, self.who, self.query]))
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic store with seed_store on a throwaway database and drive every '
+            'route of the URLconf through the test client, reporting latency percentiles, queries '
+            'and memory. --output saves the results as a baseline; --baseline compares against one '
+            'and fails on regressions.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiplies the seeded rows: ' +
+                                 ', '.join(f'{count} {name}' for name, count in DATASET.items()) + '.')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per case.')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per case first.')
+        parser.add_argument('--only', nargs='+', default=[], metavar='TEXT',
+                            help='Only run the cases whose label contains one of these.')
+        parser.add_argument('--output', metavar='FILE', help='Write the results as JSON.')
+        parser.add_argument('--baseline', metavar='FILE', help='Compare with an earlier --output.')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Fraction by which a p50 may exceed the baseline (default 0.5); '
+                                 'any increase in queries is a regression.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        # the metrics' N+1 warnings too: queries are reported per case
+        with quiet_loggers('django.request', 'moviesstore.metrics'), scratch_database(), unthrottled():
+            counts = {name: max(int(count * options['scale']), 1) for name, count in DATASET.items()}
+            # nobody votes on their own petition
+            counts['users'] = max(counts['users'], 2)
+            started = time.perf_counter()
+            self.seed(counts, options['seed'])
+            self.stdout.write(f'seeded {", ".join(f"{n} {name}" for name, n in counts.items())} '
+                              f'in {time.perf_counter() - started:.1f}s on {connection.vendor}')
+            results = self.run(options)
+
+        report = {
+            'meta': {
+                'scale': options['scale'],
+                'repeat': options['repeat'],
+                'vendor': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'max_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            },
+            'results': results,
+        }
+        self.stdout.write(f"peak process memory {report['meta']['max_rss_kib'] / 1024:.0f} MiB")
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            self.stdout.write(f"results written to {options['output']}")
+        if baseline:
+            self.compare(report, baseline, options['tolerance'])
+
+    def seed(self, counts, seed):
+        call_command('seed_store', **counts, prefix='user', seed=seed, stdout=io.StringIO())
+        self.bench = User.objects.create_user('bench', password='benchmark')
+        self.buyer = User.objects.create_user('bench-buyer', password='benchmark')
+        self.staff = User.objects.create_superuser('bench-admin', password='benchmark')
+
+        # reviews crowd onto the first movies, as they do onto hits
+        self.movies = list(Movie.objects.order_by('id')[:10])
+        self.movie = self.movies[0]
+        self.petition = MoviePetition.objects.order_by('-upvotes', 'id').first()
+        # the bench user gets a page or two of history
+        history = list(Order.objects.order_by('id').values_list('id', flat=True)[:25])
+        Order.objects.filter(id__in=history).update(user=self.bench)
+
+        cart = Cart.objects.create(user=self.bench)
+        CartLine.objects.bulk_create([CartLine(cart=cart, movie=movie, quantity=1) for movie in self.movies[:5]])
+        self.review = Review.objects.create(movie=self.movie, user=self.bench, comment='My own review')
+
+    def cases(self):
+        movie = {'id': self.movie.id}
+        petition = {'petition_id': self.petition.id}
+        counter = itertools.count()
+        voters = list(User.objects.filter(username__startswith='user').values_list('id', flat=True)[:20])
+
+        def own_review():
+            review = Review.objects.create(movie=self.movie, user=self.bench, comment='Going soon')
+            return {'kwargs': {**movie, 'review_id': review.id}}
+
+        def others_review():
+            review = Review.objects.create(movie=self.movie, user=self.buyer, comment='Reported soon')
+            return {'kwargs': {**movie, 'review_id': review.id}}
+
+        def fill_buyer_cart():
+            cart, _ = Cart.objects.get_or_create(user=self.buyer)
+            CartLine.objects.bulk_create(
+                [CartLine(cart=cart, movie=movie, quantity=1) for movie in self.movies[:3]],
+                ignore_conflicts=True,
+            )
+            return {}
+
+        def log_in_again():
+            self.clients['leaving'].force_login(self.buyer)
+            return {}
+
+        def vote():
+            return {'data': {'vote': ['up', 'down', 'none'][next(counter) % 3]}}
+
+        def new_petition():
+            n = next(counter)
+            # the previous one would be refused as a duplicate of the same user's
+            MoviePetition.objects.filter(petitioner=self.bench, title__startswith='Benchmark petition').delete()
+            return {'data': {'title': f'Benchmark petition {n}', 'description': 'Please add it', 'confirm': '1'}}
+
+        def doomed_movie():
+            movie = Movie.objects.create(name='Deleted soon', price=5, description='Goes with its reviews')
+            Review.objects.bulk_create([Review(movie=movie, user=self.buyer, comment='Gone') for _ in range(20)])
+            return {'kwargs': {'object_id': movie.id}}
+
+        def doomed_review():
+            review = Review.objects.create(movie=self.movie, user=self.buyer, comment='Deleted soon')
+            return {'kwargs': {'object_id': review.id}}
+
+        def doomed_petition():
+            petition = MoviePetition.objects.create(
+                title='Deleted soon', description='Goes with its votes', petitioner=self.buyer)
+            PetitionVote.objects.bulk_create([
+                PetitionVote(petition=petition, voter_id=voter, vote_type=True) for voter in voters])
+            return {'kwargs': {'object_id': petition.id}}
+
+        def new_user():
+            n = next(counter)
+            return {'data': {'username': f'signup{n}', 'password1': 'b3nchmark-pass', 'password2': 'b3nchmark-pass'}}
+
+        cases = [
+            Case('home.index', 'anon'),
+            Case('home.index', 'user'),
+            Case('home.about', 'anon'),
+            Case('movies.index', 'anon'),
+            Case('movies.index', 'user'),
+            Case('movies.index', 'user', query='?search=night'),
+            Case('movies.index_page', 'anon'),
+            Case('movies.show', 'anon', kwargs=movie),
+            Case('movies.show', 'user', kwargs=movie),
+            Case('movies.reviews', 'anon', kwargs=movie),
+            Case('movies.create_review', 'user', 'POST', kwargs=movie, data={'comment': 'Benchmarked'}),
+            Case('movies.edit_review', 'user', kwargs={**movie, 'review_id': self.review.id}),
+            Case('movies.edit_review', 'user', 'POST', kwargs={**movie, 'review_id': self.review.id},
+                 data={'comment': 'Edited'}),
+            Case('movies.delete_review', 'user', 'POST', prepare=own_review),
+            Case('movies.report_review', 'user', 'POST', data={'reason': 'spam'}, prepare=others_review),
+            Case('movies.petition_list', 'anon'),
+            Case('movies.petition_list', 'user'),
+            Case('movies.petition_create', 'user'),
+            Case('movies.petition_create', 'user', 'POST', prepare=new_petition),
+            Case('movies.petition_suggest', 'user', query='?q=golden night'),
+            Case('movies.petition_detail', 'anon', kwargs=petition),
+            Case('movies.petition_detail', 'user', kwargs=petition),
+            Case('movies.petition_vote', 'user', 'POST', kwargs=petition, prepare=vote),
+            Case('movies.petition_stream', 'anon', kwargs=petition),
+            Case('accounts.signup', 'anon'),
+            Case('accounts.signup', 'anon', 'POST', prepare=new_user),
+            Case('accounts.login', 'anon'),
+            Case('accounts.login', 'anon', 'POST', data={'username': 'bench', 'password': 'benchmark'}),
+            Case('accounts.logout', 'leaving', 'POST', prepare=log_in_again),
+            Case('accounts.orders', 'user'),
+            Case('cart.index', 'user'),
+            Case('cart.add', 'user', 'POST', kwargs={'id': self.movies[7].id}, data={'quantity': 2}),
+            Case('cart.clear', 'buyer', 'POST', prepare=fill_buyer_cart),
+            Case('cart.purchase', 'buyer', 'POST', prepare=fill_buyer_cart),
+            Case('metrics', 'staff'),
+            Case('admin:index', 'staff'),
+            Case('admin:login', 'anon'),
+            Case('admin:password_change', 'staff'),
+            Case('admin:password_change_done', 'staff'),
+            Case('admin:jsi18n', 'staff'),
+        ]
+        for app_label in sorted({model._meta.app_label for model in admin.site._registry}):
+            cases.append(Case('admin:app_list', 'staff', kwargs={'app_label': app_label}))
+        cases.append(Case('admin:auth_user_password_change', 'staff', kwargs={'id': self.bench.pk}))
+        # objects as the admin lists them, e.g. only reported reviews in the queue
+        request = RequestFactory().get('/')
+        request.user = self.staff
+        for model, model_admin in admin.site._registry.items():
+            prefix = f'admin:{model._meta.app_label}_{model._meta.model_name}'
+            cases.append(Case(f'{prefix}_changelist', 'staff'))
+            cases.append(Case(f'{prefix}_add', 'staff'))
+            obj = model_admin.get_queryset(request).order_by('pk').first()
+            if obj is not None:
+                for view in ('change', 'history', 'delete'):
+                    cases.append(Case(f'{prefix}_{view}', 'staff', kwargs={'object_id': obj.pk}))
+        # confirmed deletes, with the rows they cascade to
+        confirm = {'post': 'yes'}
+        cases += [
+            Case('admin:movies_movie_delete', 'staff', 'POST', data=confirm, prepare=doomed_movie),
+            Case('admin:movies_review_delete', 'staff', 'POST', data=confirm, prepare=doomed_review),
+            Case('admin:movies_moviepetition_delete', 'staff', 'POST', data=confirm, prepare=doomed_petition),
+        ]
+        return cases
+
+    def run(self, options):
+        # 'leaving' is logged in again before every logout it is timed on
+        self.clients = {
+            name: Client(raise_request_exception=False)
+            for name in ('anon', 'user', 'buyer', 'leaving', 'staff')
+        }
+        self.clients['user'].force_login(self.bench)
+        self.clients['buyer'].force_login(self.buyer)
+        self.clients['staff'].force_login(self.staff)
+
+        cases = self.cases()
+        if options['only']:
+            cases = [case for case in cases if any(text in case.label for text in options['only'])]
+        covered = {case.route for case in cases}
+
+        width = max(len(case.label) for case in cases)
+        self.stdout.write(f"{'case':<{width}}  status    p50ms    p95ms    p99ms  queries  dupes  alloc KiB")
+        results = {}
+        for case in cases:
+            result = self.measure(case, options['warmup'], options['repeat'])
+            results[case.label] = result
+            self.stdout.write(
+                f"{case.label:<{width}}  {result['status']:>6} {result['p50']:8.2f} {result['p95']:8.2f} "
+                f"{result['p99']:8.2f} {result['queries']:8} {result['duplicates']:6} {result['alloc_kib']:10}"
+            )
+
+        # unnamed patterns are redirects and catch-alls
+        missing = [name for name, route in iter_routes() if name != route and name not in covered]
+        if missing and not options['only']:
+            self.stdout.write(f"not benchmarked: {', '.join(missing)}")
+        return results
+
+    def measure(self, case, warmup, repeat):
+        client = self.clients[case.who]
+        send = client.get if case.method == 'GET' else client.post
+        latencies, queries, duplicates, db, templates, statuses = [], [], [], [], [], set()
+        alloc = 0
+        # the last round is untimed and traced for memory
+        for n in range(warmup + repeat + 1):
+            request = {'kwargs': case.kwargs, 'data': case.data}
+            if case.prepare:
+                request.update(case.prepare())
+            path = reverse(case.route, kwargs=request['kwargs']) + case.query
+            traced = n == warmup + repeat
+            if traced:
+                tracemalloc.start()
+            start = time.perf_counter()
+            response = send(path, request['data'])
+            elapsed = time.perf_counter() - start
+            if traced:
+                alloc = tracemalloc.get_traced_memory()[1] // 1024
+                tracemalloc.stop()
+            if n < warmup or traced:
+                continue
+
+            latencies.append(elapsed * 1000)
+            statuses.add(response.status_code)
+            timing = SERVER_TIMING.search(response.get('Server-Timing', ''))
+            if timing:
+                queries.append(int(timing['queries']))
+                duplicates.append(int(timing['duplicates']))
+                db.append(float(timing['db']))
+                templates.append(float(timing['templates']))
+
+        latencies.sort()
+        return {
+            'status': '/'.join(str(status) for status in sorted(statuses)),
+            'mean': round(statistics.fmean(latencies), 3),
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(latencies[-1], 3),
+            'queries': int(statistics.median(queries)) if queries else 0,
+            'duplicates': int(statistics.median(duplicates)) if duplicates else 0,
+            'db_ms': round(statistics.median(db), 3) if db else 0.0,
+            'template_ms': round(statistics.median(templates), 3) if templates else 0.0,
+            'alloc_kib': alloc,
+        }
+
+    def compare(self, report, baseline, tolerance):
+        if baseline['meta'].get('scale') != report['meta']['scale']:
+            self.stdout.write(self.style.WARNING(
+                f"the baseline was seeded at scale {baseline['meta'].get('scale')}, "
+                f"this run at {report['meta']['scale']}"))
+        regressions = []
+        for label, result in report['results'].items():
+            before = baseline['results'].get(label)
+            if before is None:
+                continue
+            if result['queries'] > before['queries']:
+                regressions.append(f"{label}: {before['queries']} -> {result['queries']} queries")
+            if (result['p50'] > before['p50'] * (1 + tolerance)
+                    and result['p50'] - before['p50'] >= MIN_REGRESSION_MS):
+                regressions.append(f"{label}: p50 {before['p50']:.2f}ms -> {result['p50']:.2f}ms")
+            if result['status'] != before['status']:
+                regressions.append(f"{label}: status {before['status']} -> {result['status']}")
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            raise CommandError(f'{len(regressions)} regressions against the baseline.')
+        self.stdout.write(self.style.SUCCESS('no regressions against the baseline'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from movies.images import generate_thumbnails
+from movies.models import Movie
+
+
+class Command(BaseCommand):
+    help = 'Create the resized poster derivatives for every movie that is missing some.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate derivatives that already exist.')
+
+    def handle(self, *args, **options):
+        written = 0
+        images = Movie.objects.exclude(image='').values_list('image', flat=True).distinct()
+        for image_name in images.iterator():
+            try:
+                written += generate_thumbnails(image_name, force=options['force'])
+            except OSError as error:
+                self.stderr.write(f'Skipping {image_name}: {error}')
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} thumbnail(s).'))
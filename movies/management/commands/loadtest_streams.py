@@ -0,0 +1,153 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.utils.crypto import get_random_string
+
+from movies.models import MoviePetition
+from moviesstore.benchmarks import HTTPConnection, format_summary, summarize
+
+USER_PREFIX = 'loadtest-streamer'
+
+
+def process_status(pid):
+    """Threads and resident memory of a local process, from /proc."""
+    fields = {}
+    for line in Path(f'/proc/{pid}/status').read_text().splitlines():
+        name, _, value = line.partition(':')
+        fields[name] = value.strip()
+    return f"{fields['Threads']} threads, {fields['VmRSS']} resident"
+
+
+class Command(BaseCommand):
+    help = ('Hold many idle server-sent event streams on one petition of a running ASGI server, '
+            'then vote on it and report how long each vote took to reach every stream. The '
+            'petition and voter are created in the configured database and deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', required=True,
+                            help='Base URL of a local server, e.g. http://127.0.0.1:8000.')
+        parser.add_argument('--streams', type=int, default=1000, help='Streams to hold open.')
+        parser.add_argument('--votes', type=int, default=20)
+        parser.add_argument('--interval', type=float, default=0.5, help='Seconds between votes.')
+        parser.add_argument('--timeout', type=float, default=10.0,
+                            help='Seconds to wait for a vote to reach every stream.')
+        parser.add_argument('--pid', type=int,
+                            help='Server worker process, to report its threads and memory.')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('--url must look like http://host:port')
+
+        owner = User.objects.create_user(f'{USER_PREFIX}-owner')
+        petition = MoviePetition.objects.create(
+            title='Load test petition', description='', petitioner=owner)
+        client = Client()
+        client.force_login(User.objects.create_user(f'{USER_PREFIX}-voter'))
+        cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+        try:
+            asyncio.run(self.run(url, petition.id, cookie, options))
+        finally:
+            Session.objects.filter(session_key=cookie).delete()
+            User.objects.filter(username__startswith=USER_PREFIX).delete()
+
+    async def run(self, url, petition_id, cookie, options):
+        base = url.path.rstrip('/')
+        host, port = url.hostname, url.port or 80
+        pid = options['pid']
+        if pid:
+            self.stdout.write(f'server before: {process_status(pid)}')
+
+        # every stream reports the upvotes it sees; a round waits for all of them
+        expected = None
+        arrivals = []
+        everyone = asyncio.Event()
+
+        def on_event(counts):
+            if counts['upvotes'] == expected:
+                arrivals.append(time.perf_counter())
+                if len(arrivals) == options['streams']:
+                    everyone.set()
+
+        readers, ready = [], []
+        connected = asyncio.Event()
+        started = time.perf_counter()
+
+        async def listen():
+            reader, writer = await asyncio.open_connection(host, port)
+            readers.append(writer)
+            writer.write((f'GET {base}/movies/petitions/{petition_id}/stream/ HTTP/1.1\r\n'
+                          f'Host: {host}:{port}\r\nAccept: text/event-stream\r\n\r\n').encode())
+            status = int((await reader.readline()).split()[1])
+            if status != 200:
+                raise CommandError(f'The stream answered {status}.')
+            # the head, then chunk sizes and event lines; only the data matters
+            counted = False
+            while line := await reader.readline():
+                if line.startswith(b'data: '):
+                    if not counted:
+                        counted = True
+                        ready.append(writer)
+                        if len(ready) == options['streams']:
+                            connected.set()
+                    on_event(json.loads(line[6:]))
+
+        listeners = []
+        for _ in range(options['streams']):
+            listeners.append(asyncio.create_task(listen()))
+            # do not swamp the listen backlog
+            await asyncio.sleep(0)
+        await asyncio.wait_for(connected.wait(), 60)
+        self.stdout.write(f'{options["streams"]} streams open and answered '
+                          f'in {time.perf_counter() - started:.2f}s')
+        if pid:
+            self.stdout.write(f'server with the streams open: {process_status(pid)}')
+
+        csrf_token = get_random_string(32)
+        connection = HTTPConnection(host, port)
+        fan_out, first, missed = [], [], 0
+        try:
+            for n in range(options['votes']):
+                choice = 'up' if n % 2 == 0 else 'none'
+                expected = 1 if choice == 'up' else 0
+                arrivals.clear()
+                everyone.clear()
+                sent = time.perf_counter()
+                status, content = await connection.post(
+                    f'{base}/movies/petitions/{petition_id}/vote/',
+                    {'vote': choice},
+                    {
+                        'Cookie': f'{settings.SESSION_COOKIE_NAME}={cookie}; '
+                                  f'{settings.CSRF_COOKIE_NAME}={csrf_token}',
+                        'X-CSRFToken': csrf_token,
+                    },
+                )
+                if status != 200 or b'"success"' not in content:
+                    raise CommandError(f'The vote failed: {status} {content[:200]!r}')
+                try:
+                    await asyncio.wait_for(everyone.wait(), options['timeout'])
+                except TimeoutError:
+                    missed += options['streams'] - len(arrivals)
+                if arrivals:
+                    first.append(arrivals[0] - sent)
+                    fan_out.append(arrivals[-1] - sent)
+                await asyncio.sleep(options['interval'])
+        finally:
+            connection.close()
+            for listener in listeners:
+                listener.cancel()
+            for writer in readers:
+                writer.close()
+
+        self.stdout.write(f'{options["votes"]} votes, each to {options["streams"]} streams '
+                          f'({options["url"]}): {missed} deliveries missed')
+        self.stdout.write('  ' + format_summary('first stream', summarize(first)))
+        self.stdout.write('  ' + format_summary('last stream', summarize(fan_out)))
@@ -0,0 +1,157 @@
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.utils.crypto import get_random_string
+
+from movies.models import MoviePetition, PetitionVote
+from moviesstore.benchmarks import HTTPConnection, format_summary, quiet_loggers, scratch_database, summarize, unthrottled
+
+USER_PREFIX = 'loadtest-voter'
+
+
+class Command(BaseCommand):
+    help = ('Fire votes at the async petition_vote endpoint at a fixed rate and report what it '
+            'sustained: in-process through the ASGI handler on a throwaway database, or with '
+            '--url against a running ASGI server that uses the configured database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rate', type=int, default=1000, help='Votes started per second.')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds to keep voting.')
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--petitions', type=int, default=20)
+        parser.add_argument('--url', help='Base URL of a local server, e.g. http://127.0.0.1:8000. '
+                                          'Voters and petitions are created in the configured '
+                                          'database and deleted afterwards. Start the server '
+                                          'with MOVIESSTORE_RATE_LIMITS=off, as every voter '
+                                          'shares one IP address.')
+        parser.add_argument('--connections', type=int, default=100,
+                            help='Keep-alive connections to the server with --url.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['url']:
+            url = urlsplit(options['url'])
+            if url.scheme != 'http' or not url.hostname:
+                raise CommandError('--url must look like http://host:port')
+            with self.fixtures(options) as (petition_ids, cookies):
+                asyncio.run(self.against_server(url, petition_ids, cookies, options))
+            return
+
+        with quiet_loggers(), scratch_database(on_disk=True), unthrottled():
+            with self.fixtures(options) as (petition_ids, cookies):
+                asyncio.run(self.in_process(petition_ids, cookies, options))
+
+    @contextmanager
+    def fixtures(self, options):
+        """Create petitions and logged-in voters; yield their ids and session cookies."""
+        owner = User.objects.create_user(f'{USER_PREFIX}-owner')
+        petitions = MoviePetition.objects.bulk_create([
+            MoviePetition(title=f'Load test petition {i}', description='', petitioner=owner)
+            for i in range(options['petitions'])
+        ])
+        cookies = []
+        for n in range(options['users']):
+            client = Client()
+            client.force_login(User.objects.create_user(f'{USER_PREFIX}{n}'))
+            cookies.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+        try:
+            yield [petition.id for petition in petitions], cookies
+        finally:
+            self.report_drift(petitions)
+            Session.objects.filter(session_key__in=cookies).delete()
+            User.objects.filter(username__startswith=USER_PREFIX).delete()
+
+    async def in_process(self, petition_ids, cookies, options):
+        clients = []
+        for cookie in cookies:
+            client = AsyncClient()
+            client.cookies[settings.SESSION_COOKIE_NAME] = cookie
+            clients.append(client)
+
+        async def send(voter, petition_id, choice):
+            response = await clients[voter].post(
+                f'/movies/petitions/{petition_id}/vote/', {'vote': choice})
+            return response.status_code, response.content
+
+        await self.run(send, petition_ids, options)
+
+    async def against_server(self, url, petition_ids, cookies, options):
+        pool = asyncio.Queue()
+        connections = [HTTPConnection(url.hostname, url.port or 80) for _ in range(options['connections'])]
+        for connection in connections:
+            pool.put_nowait(connection)
+        csrf_token = get_random_string(32)
+
+        async def send(voter, petition_id, choice):
+            connection = await pool.get()
+            try:
+                return await connection.post(
+                    f'{url.path.rstrip("/")}/movies/petitions/{petition_id}/vote/',
+                    {'vote': choice},
+                    {
+                        'Cookie': f'{settings.SESSION_COOKIE_NAME}={cookies[voter]}; '
+                                  f'{settings.CSRF_COOKIE_NAME}={csrf_token}',
+                        'X-CSRFToken': csrf_token,
+                    },
+                )
+            except (OSError, asyncio.IncompleteReadError, IndexError, ValueError):
+                connection.close()
+                return 0, b''
+            finally:
+                pool.put_nowait(connection)
+
+        try:
+            await self.run(send, petition_ids, options)
+        finally:
+            for connection in connections:
+                connection.close()
+
+    async def run(self, send, petition_ids, options):
+        rng = random.Random(options['seed'])
+        total = int(options['rate'] * options['duration'])
+        latencies = []
+        failures = 0
+
+        async def vote(voter, petition_id, choice):
+            nonlocal failures
+            begun = time.perf_counter()
+            status, content = await send(voter, petition_id, choice)
+            latencies.append(time.perf_counter() - begun)
+            if status != 200 or b'"success"' not in content:
+                failures += 1
+
+        # open loop: votes start on schedule whether or not earlier ones finished
+        tasks = []
+        start = time.perf_counter()
+        for i in range(total):
+            delay = start + i / options['rate'] - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(vote(
+                rng.randrange(options['users']), rng.choice(petition_ids), rng.choice(['up', 'down', 'none']),
+            )))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(f'{total} votes offered at {options["rate"]}/s for {options["duration"]}s '
+                          f'to {options["petitions"]} petitions by {options["users"]} users '
+                          f'({options["url"] or "in-process"})')
+        self.stdout.write(f'  completed in {elapsed:.2f}s: {total / elapsed:.0f} votes/s, '
+                          f'{failures} failures')
+        self.stdout.write('  ' + format_summary('latency', summarize(latencies)))
+
+    def report_drift(self, petitions):
+        drift = 0
+        for petition in MoviePetition.objects.filter(id__in=[p.id for p in petitions]):
+            votes = PetitionVote.objects.filter(petition=petition)
+            drift += abs(petition.upvotes - votes.filter(vote_type=True).count())
+            drift += abs(petition.downvotes - votes.filter(vote_type=False).count())
+        self.stdout.write(f'  counter drift {drift}')
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = ('Recompute the daily per-movie sales and review rollups from the orders and reviews, '
+            'e.g. after orders were deleted or rows imported in bulk. Purchases wait while it '
+            'runs, so run it off-peak or limit it with --since.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only recompute the days from this one on, YYYY-MM-DD.')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError(f"{options['since']!r} is not a YYYY-MM-DD date.")
+        rows = rebuild(since)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} daily movie rollup(s).'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from movies.models import MoviePetition
+from movies.votes import vote_tally
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized upvote/downvote counters on petitions from PetitionVote.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('petition_ids', nargs='*', type=int,
+                            help='Only rebuild these petitions (default: all).')
+
+    def handle(self, *args, **options):
+        petitions = MoviePetition.objects.all()
+        if options['petition_ids']:
+            petitions = petitions.filter(id__in=options['petition_ids'])
+        updated = petitions.update(upvotes=vote_tally(True), downvotes=vote_tally(False))
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt vote counters for {updated} petition(s).'))
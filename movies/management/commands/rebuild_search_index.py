@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from movies.search import install_search_index
+from movies.titles import install_title_indexes
+
+
+class Command(BaseCommand):
+    help = ('Recreate the SQLite FTS5 movie search index and the title trigram indexes, with '
+            'their sync triggers, then reindex every movie and petition.')
+
+    def handle(self, *args, **options):
+        with connection.schema_editor() as schema_editor:
+            installed = install_search_index(schema_editor)
+            titles_installed = install_title_indexes(schema_editor)
+        if not installed:
+            raise CommandError('This database does not support FTS5; searches use the fallback query.')
+        if not titles_installed:
+            raise CommandError('This SQLite has no trigram tokenizer; title matching uses the fallback query.')
+        self.stdout.write(self.style.SUCCESS('Movie search and title indexes rebuilt.'))
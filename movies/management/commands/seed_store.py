@@ -0,0 +1,279 @@
+import contextlib
+import random
+import time
+from array import array
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.utils import timezone
+
+from cart.models import Item, Order
+from movies.models import Movie, MoviePetition, PetitionVote, Report, Review
+from movies.rollups import rebuild
+from movies.votes import vote_tally
+from moviesstore.cache import bump
+from moviesstore.utils import batched
+
+ADJECTIVES = [
+    'Silent', 'Golden', 'Broken', 'Last', 'Hidden', 'Crimson', 'Frozen', 'Electric', 'Lonely', 'Savage',
+    'Midnight', 'Endless', 'Burning', 'Forgotten', 'Wild', 'Distant', 'Iron', 'Velvet', 'Hollow', 'Secret',
+]
+NOUNS = [
+    'River', 'Empire', 'Garden', 'Storm', 'City', 'Horizon', 'Kingdom', 'Witness', 'Harbor', 'Signal',
+    'Orchard', 'Frontier', 'Mirror', 'Voyage', 'Summer', 'Shadow', 'Station', 'Legacy', 'Island', 'Engine',
+]
+PHRASES = [
+    'a slow burn that pays off', 'the soundtrack carries it', 'great cast, thin plot',
+    'better than the book', 'too long by half an hour', 'the ending surprised me',
+    'beautifully shot', 'perfect for a rainy night', 'the sequel we deserved', 'not for everyone',
+]
+
+# every seeded user logs in with it
+PASSWORD = 'seed-password'
+
+
+def allocate(total, weights, cap):
+    """Split ``total`` in proportion to ``weights``, giving none more than ``cap``."""
+    shares = [0] * len(weights)
+    uncapped = set(range(len(weights)))
+    while uncapped and total > 0:
+        weight = sum(weights[i] for i in uncapped)
+        capped = {i for i in uncapped if total * weights[i] / weight >= cap}
+        if not capped:
+            for i in uncapped:
+                shares[i] = round(total * weights[i] / weight)
+            break
+        # what the capped ones cannot take goes to the others
+        for i in capped:
+            shares[i] = cap
+        total -= cap * len(capped)
+        uncapped -= capped
+    return shares
+
+
+def skewed(rng, count):
+    """An index below ``count``, low ones far likelier, as hits draw most activity."""
+    return int(count * rng.random() ** 3)
+
+
+@contextlib.contextmanager
+def explicit_dates(*fields):
+    """Let bulk_create keep the dates given to ``auto_now_add`` fields."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ('Fill the configured database with a deterministic synthetic store: movies, users, '
+            'reviews, reports, petitions, votes and orders with their items. Rows are generated '
+            'and inserted in batches, so memory stays flat whatever the counts; only the ids of '
+            'movies, users and reviews are kept, in compact arrays.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=10_000)
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--reviews', type=int, default=200_000)
+        parser.add_argument('--reports', type=int, default=2000)
+        parser.add_argument('--petitions', type=int, default=5000)
+        parser.add_argument('--votes', type=int, default=1_000_000,
+                            help='At most one per user and petition, so capped by their product.')
+        parser.add_argument('--orders', type=int, default=100_000)
+        parser.add_argument('--items', type=int, default=3, help='Mean items per order.')
+        parser.add_argument('--days', type=int, default=365, help='Spread the dates over this many days.')
+        parser.add_argument('--prefix', default='seed', help='Usernames are <prefix><n>.')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Seed at least two users: nobody votes on their own petition.')
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f"Users named {options['prefix']}* exist already; pick another --prefix.")
+
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.span = options['days'] * 86400
+        self.batch_size = options['batch_size']
+
+        started = time.perf_counter()
+        with explicit_dates(
+            Review._meta.get_field('date'),
+            Report._meta.get_field('created_at'),
+            MoviePetition._meta.get_field('created_at'),
+            PetitionVote._meta.get_field('created_at'),
+            Order._meta.get_field('date'),
+        ):
+            users = self.insert('users', User, self.users(options['users'], options['prefix']))
+            prices = array('h')
+            movies = self.insert('movies', Movie, self.movies(options['movies'], prices))
+            reviews = self.insert('reviews', Review, self.reviews(options['reviews'], movies, users))
+            self.insert('reports', Report, self.reports(options['reports'], reviews, users), keep_ids=False)
+            petitioners = array('q')
+            petitions = self.insert(
+                'petitions', MoviePetition, self.petitions(options['petitions'], users, petitioners))
+            self.copy('votes', PetitionVote, ['petition', 'voter', 'vote_type', 'created_at'],
+                      self.votes(options['votes'], petitions, petitioners, users))
+            self.orders(options['orders'], options['items'], movies, prices, users)
+
+        # the seeded rows have the highest ids, too many to list in an IN (...)
+        if petitions:
+            self.timed('vote counters', lambda: MoviePetition.objects.filter(id__gte=petitions[0]).update(
+                upvotes=vote_tally(True), downvotes=vote_tally(False)))
+        if reviews:
+            self.timed('hidden reviews', lambda: Review.objects.filter(
+                id__gte=reviews[0], reports__resolved=False).update(is_active=False))
+        # the bulk inserts skipped the rollups' hooks
+        self.timed('daily rollups', rebuild)
+        # pages cached before the seed would hide it
+        bump('catalog', 'petitions')
+        self.stdout.write(f'done in {time.perf_counter() - started:.1f}s')
+
+    def insert(self, label, model, objects, keep_ids=True):
+        """bulk_create ``objects`` batch by batch; return the new ids if ``keep_ids``."""
+        ids = array('q')
+        count = 0
+        start = time.perf_counter()
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                created = model.objects.bulk_create(batch)
+            if keep_ids:
+                ids.extend(obj.pk for obj in created)
+            count += len(batch)
+            # with DEBUG on, the connection keeps the last 9000 statements
+            reset_queries()
+        self.report(label, count, time.perf_counter() - start)
+        return ids
+
+    def copy(self, label, model, fields, rows):
+        """Insert ``rows``, tuples of ready database values for ``fields``, batch by batch.
+
+        For the tables reaching millions of rows: executemany() costs a fraction
+        of bulk_create(), which builds a model and prepares every value through
+        its field.
+        """
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+        sql = (f'INSERT INTO {quote(model._meta.db_table)} ({columns}) '
+               f'VALUES ({", ".join(["%s"] * len(fields))})')
+        count = 0
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            for batch in batched(rows, self.batch_size):
+                with transaction.atomic():
+                    cursor.executemany(sql, batch)
+                count += len(batch)
+                reset_queries()
+        self.report(label, count, time.perf_counter() - start)
+
+    def timed(self, label, func):
+        start = time.perf_counter()
+        count = func()
+        self.report(label, count, time.perf_counter() - start)
+
+    def report(self, label, count, elapsed):
+        self.stdout.write(f'{count:>9} {label:<15} {elapsed:7.1f}s {count / max(elapsed, 1e-9):>9.0f}/s')
+
+    def date(self):
+        return self.now - timedelta(seconds=self.rng.randrange(self.span))
+
+    def users(self, count, prefix):
+        # one hash for everyone; hashing per user would take longer than the rest of the seed
+        password = make_password(PASSWORD)
+        for n in range(count):
+            yield User(username=f'{prefix}{n}', password=password, email=f'{prefix}{n}@example.com')
+
+    def movies(self, count, prices):
+        rng = self.rng
+        for n in range(count):
+            price = rng.randint(2, 30)
+            prices.append(price)
+            yield Movie(
+                name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}' + (f' {n // 400 + 1}' if n >= 400 else ''),
+                price=price,
+                description=' '.join(rng.sample(PHRASES, 3)).capitalize() + '.',
+                image='movie_images/avatar.jpeg',
+            )
+
+    def reviews(self, count, movies, users):
+        rng = self.rng
+        for _ in range(count):
+            yield Review(
+                movie_id=movies[skewed(rng, len(movies))],
+                user_id=rng.choice(users),
+                comment=rng.choice(PHRASES).capitalize() + '.',
+                date=self.date(),
+            )
+
+    def reports(self, count, reviews, users):
+        rng = self.rng
+        for _ in range(min(count, len(reviews))):
+            yield Report(
+                review_id=rng.choice(reviews),
+                reporter_id=rng.choice(users),
+                reason=rng.choice(['spoilers', 'spam', 'offensive', '']),
+                resolved=rng.random() < 0.5,
+                created_at=self.date(),
+            )
+
+    def petitions(self, count, users, petitioners):
+        rng = self.rng
+        for _ in range(count):
+            petitioner = rng.choice(users)
+            petitioners.append(petitioner)
+            yield MoviePetition(
+                title=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}',
+                description=' '.join(rng.sample(PHRASES, 2)).capitalize() + '.',
+                petitioner_id=petitioner,
+                created_at=self.date(),
+            )
+
+    def votes(self, count, petitions, petitioners, users):
+        """Vote rows spread over petitions by popularity, one per user and petition."""
+        rng = self.rng
+        adapt = connection.ops.adapt_datetimefield_value
+        shares = allocate(count, [1 / (rank + 1) ** 0.8 for rank in range(len(petitions))], len(users) - 1)
+        for petition_id, petitioner, share in zip(petitions, petitioners, shares):
+            # sampling positions without replacement keeps (petition, voter) unique
+            for position in rng.sample(range(len(users) - 1), share):
+                voter = users[position]
+                if voter == petitioner:
+                    # the petitioner's place goes to the one position sample() skips
+                    voter = users[-1]
+                yield petition_id, voter, rng.random() < 0.75, adapt(self.date())
+
+    def orders(self, count, mean_items, movies, prices, users):
+        rng = self.rng
+        orders = items = 0
+        start = time.perf_counter()
+        for size in (min(self.batch_size, count - done) for done in range(0, count, self.batch_size)):
+            batch, lines = [], []
+            for _ in range(size):
+                chosen = {skewed(rng, len(movies)) for _ in range(rng.randint(1, 2 * mean_items - 1))}
+                order_lines = [(movies[m], prices[m], rng.randint(1, 3)) for m in chosen]
+                batch.append(Order(
+                    user_id=rng.choice(users),
+                    total=sum(price * quantity for movie, price, quantity in order_lines),
+                    date=self.date(),
+                ))
+                lines.append(order_lines)
+            with transaction.atomic():
+                Order.objects.bulk_create(batch)
+                Item.objects.bulk_create([
+                    Item(order_id=order.pk, movie_id=movie, price=price, quantity=quantity)
+                    for order, order_lines in zip(batch, lines)
+                    for movie, price, quantity in order_lines
+                ])
+            orders += len(batch)
+            items += sum(len(order_lines) for order_lines in lines)
+            reset_queries()
+        elapsed = time.perf_counter() - start
+        self.report('orders', orders, elapsed)
+        self.report('items', items, elapsed)
@@ -0,0 +1,107 @@
+import random
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+
+from movies.models import Movie, MoviePetition, PetitionVote, Report, Review
+from moviesstore.benchmarks import format_summary, quiet_loggers, scratch_database, summarize, unthrottled
+
+# "untuned" behaves like the plain sqlite3 backend: rollback journal,
+# deferred transactions, no retries
+MODES = {
+    'untuned': {'SQLITE_PRAGMAS': {}, 'SQLITE_TRANSACTION_MODE': 'DEFERRED', 'DATABASE_WRITE_ATTEMPTS': 1},
+    'tuned': {},
+}
+
+
+class Command(BaseCommand):
+    help = ('Hammer petition_vote and report_review from concurrent logged-in users on a '
+            'throwaway on-disk SQLite database, with and without the SQLite tuning.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--rounds', type=int, default=50,
+                            help='Vote + report requests per user.')
+        parser.add_argument('--petitions', type=int, default=5,
+                            help='Few petitions means many writers on the same rows.')
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with quiet_loggers():
+            for mode in options['modes']:
+                with override_settings(**MODES[mode]), unthrottled(), scratch_database(on_disk=True):
+                    self.run_mode(mode, options)
+
+    def run_mode(self, mode, options):
+        threads, rounds = options['threads'], options['rounds']
+        owner = User.objects.create_user('petitioner')
+        petitions = MoviePetition.objects.bulk_create([
+            MoviePetition(title=f'Petition {i}', description='', petitioner=owner)
+            for i in range(options['petitions'])
+        ])
+        movie = Movie.objects.create(name='Movie', price=10, description='',
+                                     image='movie_images/avatar.jpeg')
+        reviews = Review.objects.bulk_create([
+            Review(comment=f'Review {i}', movie=movie, user=owner) for i in range(threads * rounds)
+        ])
+
+        clients = []
+        for n in range(threads):
+            client = Client(raise_request_exception=False)
+            client.force_login(User.objects.create_user(f'voter{n}'))
+            clients.append(client)
+        connection.close()
+
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+        workers = [
+            threading.Thread(target=self.writer, args=(
+                client, random.Random(options['seed'] + n), [p.id for p in petitions],
+                [r.id for r in reviews[n * rounds:(n + 1) * rounds]], movie.id,
+            ))
+            for n, client in enumerate(clients)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        journal = connection.cursor().execute('PRAGMA journal_mode').fetchone()[0]
+        drift = sum(
+            abs(p.upvotes - PetitionVote.objects.filter(petition=p, vote_type=True).count())
+            + abs(p.downvotes - PetitionVote.objects.filter(petition=p, vote_type=False).count())
+            for p in MoviePetition.objects.all()
+        )
+        self.stdout.write(f'{mode} (journal_mode={journal})')
+        self.stdout.write(f'  {len(self.latencies)} writes in {elapsed:.2f}s '
+                          f'({len(self.latencies) / elapsed:.0f}/s), {self.errors} errors, '
+                          f'{Report.objects.count()} reports, counter drift {drift}')
+        self.stdout.write('  ' + format_summary('latency', summarize(self.latencies)))
+
+    def writer(self, client, rng, petition_ids, review_ids, movie_id):
+        latencies = []
+        errors = 0
+        for review_id in review_ids:
+            for path, data in [
+                (f'/movies/petitions/{rng.choice(petition_ids)}/vote/',
+                 {'vote': rng.choice(['up', 'down', 'none'])}),
+                (f'/movies/{movie_id}/review/{review_id}/report/', {'reason': 'spam'}),
+            ]:
+                start = time.perf_counter()
+                response = client.post(path, data)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 500:
+                    errors += 1
+        connection.close()
+
+        with self.lock:
+            self.latencies += latencies
+            self.errors += errors
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database onto every alias in DATABASE_REPLICAS, a local '
+            'stand-in for replication when trying out the read replica router.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=None, metavar='SECONDS',
+                            help='Keep copying at this interval, which then acts as the replica lag.')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas configured; set MOVIESSTORE_REPLICAS.')
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Only SQLite databases are copied; server databases replicate themselves.')
+
+        while True:
+            self.sync(primary)
+            if options['every'] is None:
+                break
+            time.sleep(options['every'])
+
+    def sync(self, primary):
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            replica = connections[alias]
+            replica.ensure_connection()
+            primary.connection.backup(replica.connection)
+            self.stdout.write(f"{alias}: copied {primary.settings_dict['NAME']} to {replica.settings_dict['NAME']}")
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.recommendations import update_recommendations
+
+
+class Command(BaseCommand):
+    help = ('Count the orders placed since the last run into the co-purchase matrix and recompute '
+            'the "customers also bought" movies they affect. Run it periodically, e.g. from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50_000, help='Orders counted per transaction.')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Start over from the first order, e.g. after orders were deleted.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counted, stored = update_recommendations(options['batch_size'], options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Counted {counted} order(s) and stored {stored} similarities '
+            f'in {time.perf_counter() - start:.1f}s.'))
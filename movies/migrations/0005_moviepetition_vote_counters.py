@@ -0,0 +1,42 @@
+# Generated by Django 5.0 on 2026-10-18 05:23
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_vote_counters(apps, schema_editor):
+    MoviePetition = apps.get_model("movies", "MoviePetition")
+    PetitionVote = apps.get_model("movies", "PetitionVote")
+
+    def tally(vote_type):
+        votes = (
+            PetitionVote.objects.filter(petition=OuterRef("pk"), vote_type=vote_type)
+            .order_by()
+            .values("petition")
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        return Coalesce(Subquery(votes, output_field=IntegerField()), 0)
+
+    MoviePetition.objects.update(upvotes=tally(True), downvotes=tally(False))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("movies", "0004_moviepetition_petitionvote"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="moviepetition",
+            name="downvotes",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="moviepetition",
+            name="upvotes",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_vote_counters, migrations.RunPython.noop),
+    ]
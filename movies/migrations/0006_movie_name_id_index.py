@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("movies", "0005_moviepetition_vote_counters"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(
+                fields=["name", "id"], name="movies_movi_name_3573ca_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0 on 2026-10-18 05:31
+
+from django.db import DatabaseError, migrations
+
+# the schema as of this migration; movies.search may change after it
+SEARCH_INDEX = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS movies_movie_fts USING fts5(
+        name, description,
+        content='movies_movie', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    """INSERT INTO movies_movie_fts(movies_movie_fts, rank)
+        VALUES ('rank', 'bm25(10.0, 1.0)')""",
+    """CREATE TRIGGER IF NOT EXISTS movies_movie_fts_ai AFTER INSERT ON movies_movie BEGIN
+        INSERT INTO movies_movie_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS movies_movie_fts_ad AFTER DELETE ON movies_movie BEGIN
+        INSERT INTO movies_movie_fts(movies_movie_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS movies_movie_fts_au AFTER UPDATE ON movies_movie BEGIN
+        INSERT INTO movies_movie_fts(movies_movie_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO movies_movie_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    try:
+        for statement in SEARCH_INDEX:
+            schema_editor.execute(statement)
+    except DatabaseError:
+        # SQLite compiled without FTS5: searches use the fallback query
+        return
+    schema_editor.execute(
+        "INSERT INTO movies_movie_fts(movies_movie_fts) VALUES ('rebuild')"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for suffix in ("ai", "ad", "au"):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS movies_movie_fts_{suffix}")
+    schema_editor.execute("DROP TABLE IF EXISTS movies_movie_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("movies", "0006_movie_name_id_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
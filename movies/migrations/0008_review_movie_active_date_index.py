@@ -0,0 +1,21 @@
+# Generated by Django 5.0 on 2026-10-18 05:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("movies", "0007_movie_search_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["movie", "is_active", "date"],
+                name="movies_revi_movie_i_a7552e_idx",
+            ),
+        ),
+    ]
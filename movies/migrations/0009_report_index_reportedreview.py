@@ -0,0 +1,31 @@
+# Generated by Django 5.0 on 2026-10-18 05:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("movies", "0008_review_movie_active_date_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportedReview",
+            fields=[],
+            options={
+                "verbose_name": "reported review",
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("movies.review",),
+        ),
+        migrations.AddIndex(
+            model_name="report",
+            index=models.Index(
+                fields=["resolved", "review"], name="movies_repo_resolve_2e20ac_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.0 on 2026-10-18 06:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("movies", "0009_report_index_reportedreview"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CoPurchaseProgress",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("counted_order_id", models.IntegerField(default=0)),
+                ("ranked_order_id", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="CoPurchase",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("orders", models.PositiveIntegerField(default=0)),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="movies.movie",
+                    ),
+                ),
+                (
+                    "other",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="movies.movie",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("movie", "other")},
+            },
+        ),
+        migrations.CreateModel(
+            name="MovieSimilarity",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("rank", models.PositiveSmallIntegerField()),
+                ("score", models.FloatField()),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similarities",
+                        to="movies.movie",
+                    ),
+                ),
+                (
+                    "similar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="movies.movie",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("movie", "rank")},
+            },
+        ),
+    ]
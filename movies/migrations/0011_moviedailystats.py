@@ -0,0 +1,40 @@
+# Generated by Django 5.0 on 2026-10-18 06:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("movies", "0010_copurchase_moviesimilarity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MovieDailyStats",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("day", models.DateField()),
+                ("units", models.PositiveIntegerField(default=0)),
+                ("revenue", models.PositiveIntegerField(default=0)),
+                ("reviews", models.PositiveIntegerField(default=0)),
+                ("active_reviews", models.PositiveIntegerField(default=0)),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="movies.movie",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["day", "movie"], name="movies_movi_day_a1010c_idx"
+                    )
+                ],
+                "unique_together": {("movie", "day")},
+            },
+        ),
+    ]
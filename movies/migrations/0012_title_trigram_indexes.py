@@ -0,0 +1,62 @@
+# Generated by Django 5.0 on 2026-10-18 07:02
+
+from django.db import DatabaseError, migrations
+
+
+def trigram_index(table, content, column):
+    # the schema as of this migration; movies.titles may change after it
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+            {column}, content='{content}', content_rowid='id', tokenize='trigram'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {content} BEGIN
+            INSERT INTO {table}(rowid, {column}) VALUES (new.id, new.{column});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {content} BEGIN
+            INSERT INTO {table}({table}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {column} ON {content} BEGIN
+            INSERT INTO {table}({table}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+            INSERT INTO {table}(rowid, {column}) VALUES (new.id, new.{column});
+        END""",
+    ]
+
+
+TITLE_INDEXES = {
+    "movies_moviepetition_trigram": ("movies_moviepetition", "title"),
+    "movies_movie_trigram": ("movies_movie", "name"),
+}
+
+
+def create_title_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    try:
+        for table, (content, column) in TITLE_INDEXES.items():
+            for statement in trigram_index(table, content, column):
+                schema_editor.execute(statement)
+    except DatabaseError:
+        # SQLite without FTS5, or older than 3.34 and its trigram tokenizer:
+        # title lookups use the fallback query
+        return
+    for table in TITLE_INDEXES:
+        schema_editor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def drop_title_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for table in TITLE_INDEXES:
+        for suffix in ("ai", "ad", "au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("movies", "0011_moviedailystats"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_title_indexes, drop_title_indexes),
+    ]
@@ -11,6 +11,12 @@ class Movie(models.Model):
     def __str__(self):
         return str(self.id) + ' - ' + self.name
 
+    class Meta:
+        indexes = [
+            # backs the keyset pagination of the catalog
+            models.Index(fields=['name', 'id']),
+        ]
+
 class Review(models.Model):
     id = models.AutoField(primary_key=True)
     comment = models.CharField(max_length=255)
@@ -24,6 +30,12 @@ class Review(models.Model):
         self.is_active = False
         self.save(update_fields=["is_active"])
 
+    class Meta:
+        indexes = [
+            # backs the newest-first list of a movie's visible reviews
+            models.Index(fields=['movie', 'is_active', 'date']),
+        ]
+
 class Report(models.Model):
     """A simple report/audit record for inappropriate reviews."""
     id = models.AutoField(primary_key=True)
@@ -36,6 +48,20 @@ class Report(models.Model):
     def __str__(self):
         return f"Report {self.id} on review {self.review_id} by {self.reporter}"
 
+    class Meta:
+        indexes = [
+            # backs the moderation queue of unresolved reports
+            models.Index(fields=['resolved', 'review']),
+        ]
+
+
+class ReportedReview(Review):
+    """Reviews with unresolved reports, listed as the admin moderation queue."""
+
+    class Meta:
+        proxy = True
+        verbose_name = 'reported review'
+
 
 class MoviePetition(models.Model):
     """Model for user petitions to add new movies to the catalog."""
@@ -46,23 +72,25 @@ class MoviePetition(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
     admin_reviewed = models.BooleanField(default=False)
+    # denormalized vote counters, recounted by petition_vote and
+    # rebuilt from PetitionVote by the rebuild_petition_votes command
+    upvotes = models.PositiveIntegerField(default=0)
+    downvotes = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"Petition: {self.title} by {self.petitioner.username}"
 
     def get_vote_count(self):
         """Get the net vote count (upvotes - downvotes)."""
-        upvotes = self.votes.filter(vote_type=True).count()
-        downvotes = self.votes.filter(vote_type=False).count()
-        return upvotes - downvotes
+        return self.upvotes - self.downvotes
 
     def get_upvotes(self):
         """Get total upvotes."""
-        return self.votes.filter(vote_type=True).count()
+        return self.upvotes
 
     def get_downvotes(self):
         """Get total downvotes."""
-        return self.votes.filter(vote_type=False).count()
+        return self.downvotes
 
     class Meta:
         ordering = ['-created_at']
@@ -84,4 +112,66 @@ class PetitionVote(models.Model):
         unique_together = ('petition', 'voter')  # Prevent duplicate votes
         indexes = [
             models.Index(fields=['petition', 'vote_type']),
-        ]
\ No newline at end of file
+        ]
+
+class CoPurchase(models.Model):
+    """How many orders hold both movies: one cell of the sparse co-purchase matrix.
+
+    Kept for both (movie, other) and (other, movie); the diagonal cell,
+    where other is movie, counts the orders holding the movie at all.
+    Filled from cart items by ``movies.recommendations``.
+    """
+    id = models.AutoField(primary_key=True)
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('movie', 'other')
+
+
+class CoPurchaseProgress(models.Model):
+    """How far the recommendations have got through the orders, by order id."""
+    id = models.AutoField(primary_key=True)
+    # orders up to this one are counted into CoPurchase
+    counted_order_id = models.IntegerField(default=0)
+    # and the similarities they change recomputed
+    ranked_order_id = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class MovieSimilarity(models.Model):
+    """One of the movies most often bought with ``movie``, precomputed for its page."""
+    id = models.AutoField(primary_key=True)
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='similarities')
+    similar = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    # 1 for the most similar
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    def __str__(self):
+        return f'{self.movie_id} -> {self.similar_id} (#{self.rank})'
+
+    class Meta:
+        # also backs the page's lookup of a movie's ranked recommendations
+        unique_together = ('movie', 'rank')
+
+
+class MovieDailyStats(models.Model):
+    """A movie's sales and reviews on one day, rolled up by ``movies.rollups``."""
+    id = models.AutoField(primary_key=True)
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='daily_stats')
+    # in TIME_ZONE
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.PositiveIntegerField(default=0)
+    # reviews written that day, and how many of them are still visible
+    reviews = models.PositiveIntegerField(default=0)
+    active_reviews = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('movie', 'day')
+        indexes = [
+            # backs the rankings over the last days
+            models.Index(fields=['day', 'movie']),
+        ]
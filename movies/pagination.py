@@ -0,0 +1,101 @@
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Keeps full microsecond precision, which keyset equality checks need."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    """Pack the ordering values of the last row on a page into a URL-safe token."""
+    raw = json.dumps(list(values), cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Unpack a cursor token, returning None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def keyset_filter(ordering, values):
+    """Build the "comes after this row" condition for a lexicographic ordering.
+
+    ``ordering`` is a list of field names as passed to ``order_by()``
+    (``'-date'`` for descending); the last one must be unique.
+    """
+    condition = Q()
+    for position, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[position]})
+        for earlier, value in zip(ordering[:position], values):
+            step &= Q(**{earlier.lstrip('-'): value})
+        condition |= step
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor, page_size):
+    """Return ``(objects, next_cursor)`` for one page of ``queryset``.
+
+    Pages are addressed by the ordering values of the previous page's last
+    row instead of an OFFSET, so every page costs a single indexed range
+    scan no matter how deep into the results it is.
+    """
+    queryset = queryset.order_by(*ordering)
+    values = decode_cursor(cursor, len(ordering))
+    if values is not None:
+        try:
+            queryset = queryset.filter(keyset_filter(ordering, values))
+        except (ValidationError, ValueError, TypeError):
+            # a tampered cursor holding values of the wrong type
+            pass
+
+    objects = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(objects) > page_size:
+        objects = objects[:page_size]
+        last = objects[-1]
+        next_cursor = encode_cursor(getattr(last, field.lstrip('-')) for field in ordering)
+    return objects, next_cursor
+
+
+class LazyKeysetPage:
+    """A keyset_page() that only runs its query when first iterated.
+
+    Lets a view hand a page to a template whose cached fragment may never
+    look at it.
+    """
+
+    def __init__(self, queryset, ordering, cursor, page_size):
+        self.args = (queryset, ordering, cursor, page_size)
+
+    @cached_property
+    def page(self):
+        return keyset_page(*self.args)
+
+    def __iter__(self):
+        return iter(self.page[0])
+
+    @property
+    def next_cursor(self):
+        return self.page[1]
@@ -0,0 +1,120 @@
+"""Recommendations of the movies customers also bought, from the order history.
+
+``CoPurchase`` is the sparse item-item co-purchase matrix: for each pair of
+movies bought together, the number of orders holding both, and on the
+diagonal the number of orders holding each movie. ``count_orders`` adds
+new orders to it with one INSERT ... SELECT that self-joins their items and
+upserts the pair counts, so the matrix is built by the database rather
+than in Python, and a run costs in proportion to the orders it adds, not
+to the history.
+
+Movies are as similar as their columns: the cosine, co-purchases divided
+by the square root of the product of their orders, which keeps the best
+sellers from topping every list. New orders change the scores of every
+movie bought with one of theirs, and ``rank_similar`` recomputes the top
+``RECOMMENDATIONS_PER_MOVIE`` of those into ``MovieSimilarity``, which the
+movie page reads with one indexed lookup.
+
+``update_recommendations`` runs both from where the last run stopped; the
+update_recommendations command calls it.
+"""
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F, FloatField, OuterRef, Subquery, Window
+from django.db.models.functions import Cast, RowNumber, Sqrt
+
+from cart.models import Item, Order
+from moviesstore.routers import pin_primary
+from .models import CoPurchase, CoPurchaseProgress, MovieSimilarity
+
+
+def count_orders(after, upto):
+    """Add the items of the orders with ids in (``after``, ``upto``] to ``CoPurchase``."""
+    alias = router.db_for_write(CoPurchase)
+    quote = connections[alias].ops.quote_name
+    copurchase = quote(CoPurchase._meta.db_table)
+    item = quote(Item._meta.db_table)
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            f"""INSERT INTO {copurchase} (movie_id, other_id, orders)
+            SELECT a.movie_id, b.movie_id, COUNT(DISTINCT a.order_id)
+            FROM {item} a JOIN {item} b ON b.order_id = a.order_id
+            WHERE a.order_id > %s AND a.order_id <= %s
+            GROUP BY a.movie_id, b.movie_id
+            ON CONFLICT (movie_id, other_id)
+            DO UPDATE SET orders = {copurchase}.orders + excluded.orders""",
+            [after, upto],
+        )
+
+
+def rank_similar(movies):
+    """Recompute the ``MovieSimilarity`` rows of the movies in the ``movies`` subquery."""
+    def orders_of(field):
+        diagonal = CoPurchase.objects.filter(movie=OuterRef(field), other=OuterRef(field))
+        return Subquery(diagonal.values('orders'))
+
+    score = Cast('orders', FloatField()) / Sqrt(orders_of('movie') * orders_of('other'))
+    ranked = (
+        CoPurchase.objects.filter(movie__in=movies, orders__gte=settings.RECOMMENDATION_MIN_ORDERS)
+        .exclude(other=F('movie'))
+        .annotate(score=score)
+        .annotate(rank=Window(
+            RowNumber(), partition_by=F('movie'), order_by=[F('score').desc(), F('other').asc()],
+        ))
+        .filter(rank__lte=settings.RECOMMENDATIONS_PER_MOVIE)
+        .values_list('movie_id', 'other_id', 'rank', 'score')
+    )
+    with transaction.atomic(using=router.db_for_write(MovieSimilarity)):
+        MovieSimilarity.objects.filter(movie__in=movies).delete()
+        created = MovieSimilarity.objects.bulk_create(
+            MovieSimilarity(movie_id=movie, similar_id=other, rank=rank, score=score)
+            for movie, other, rank, score in ranked
+        )
+    return len(created)
+
+
+def update_recommendations(batch_size=50_000, rebuild=False):
+    """Count the orders placed since the last run, then rerank the movies they affect.
+
+    Orders are counted ``batch_size`` at a time, each batch in a transaction
+    with the progress it makes. ``rebuild`` starts over from the first order.
+    Returns (orders counted, similarities stored).
+    """
+    # ranking reads what counting has just written
+    pin_primary()
+    progress, _ = CoPurchaseProgress.objects.get_or_create(id=1)
+    if rebuild:
+        with transaction.atomic():
+            CoPurchase.objects.all().delete()
+            MovieSimilarity.objects.all().delete()
+            progress.counted_order_id = progress.ranked_order_id = 0
+            progress.save()
+
+    # orders and their items are written in one transaction, by a single
+    # writer on SQLite, so none can turn up below this id later
+    last_order_id = Order.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    counted = Order.objects.filter(id__gt=progress.counted_order_id, id__lte=last_order_id).count()
+    while progress.counted_order_id < last_order_id:
+        upto = min(progress.counted_order_id + batch_size, last_order_id)
+        with transaction.atomic():
+            count_orders(progress.counted_order_id, upto)
+            progress.counted_order_id = upto
+            progress.save()
+
+    stored = 0
+    if progress.ranked_order_id < progress.counted_order_id:
+        bought = Item.objects.filter(
+            order_id__gt=progress.ranked_order_id, order_id__lte=progress.counted_order_id,
+        ).values('movie_id')
+        stored = rank_similar(CoPurchase.objects.filter(other__in=bought).values('movie_id'))
+        progress.ranked_order_id = progress.counted_order_id
+        progress.save()
+    return counted, stored
+
+
+def similar_movies(movie):
+    """The movies most often bought with ``movie``, best first."""
+    return [
+        similarity.similar
+        for similarity in movie.similarities.select_related('similar').order_by('rank')
+    ]
@@ -0,0 +1,181 @@
+"""Daily per-movie rollups of sales and reviews.
+
+``MovieDailyStats`` has a row per movie and day, in TIME_ZONE, with the
+units sold and the revenue, the reviews written that day and how many of
+them are still visible. Rankings read the rows of their last few days,
+so their cost does not grow with the history in ``Item`` and ``Review``.
+
+Sales only ever grow, so ``record_sales`` adds each order's items to their
+rows with one upsert, inside the order's own transaction. Reviews get
+hidden, reinstated and deleted, so rather than keeping running counts
+``refresh_reviews`` recounts the rows a change touches; the receivers in
+``movies.signals`` call it, and the review admin actions queue it as the
+refresh_review_stats task.
+
+Writes that bypass both, such as deleted orders or bulk imports, are caught
+up by ``rebuild``, which the rebuild_movie_stats command runs.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from cart.models import Item
+from .models import Movie, MovieDailyStats, Review
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def insert(rows, params, columns, updates=None):
+    """Insert ``rows``, VALUES or a SELECT of ``columns``, into MovieDailyStats.
+
+    ``updates`` maps columns to SQL for their new value in rows that exist
+    already, where ``{table}.<column>`` is the current value and
+    ``excluded.<column>`` the one being inserted.
+    """
+    alias = router.db_for_write(MovieDailyStats)
+    quote = connections[alias].ops.quote_name
+    table = quote(MovieDailyStats._meta.db_table)
+    sql = f'INSERT INTO {table} ({", ".join(map(quote, columns))}) {rows}'
+    if updates:
+        assignments = ', '.join(
+            f'{quote(column)} = {value.format(table=table)}' for column, value in updates.items())
+        sql += f' ON CONFLICT ({quote("movie_id")}, {quote("day")}) DO UPDATE SET {assignments}'
+    with connections[alias].cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def record_sales(order, items):
+    """Add an order's items to the sales of their movies on the order's day."""
+    connection = connections[router.db_for_write(MovieDailyStats)]
+    day = connection.ops.adapt_datefield_value(timezone.localdate(order.date))
+    sales = {}
+    for item in items:
+        units, revenue = sales.get(item.movie_id, (0, 0))
+        sales[item.movie_id] = (units + item.quantity, revenue + item.price * item.quantity)
+    insert(
+        'VALUES ' + ', '.join(['(%s, %s, %s, %s, 0, 0)'] * len(sales)),
+        [value for movie_id, (units, revenue) in sales.items() for value in (movie_id, day, units, revenue)],
+        ['movie_id', 'day', 'units', 'revenue', 'reviews', 'active_reviews'],
+        {'units': '{table}.units + excluded.units', 'revenue': '{table}.revenue + excluded.revenue'},
+    )
+
+
+def review_counts(reviews):
+    """Reviews and visible reviews per movie and day in the ``reviews`` queryset."""
+    return (
+        reviews.annotate(day=TruncDate('date'))
+        .values('movie_id', 'day')
+        .annotate(reviews=Count('id'), active_reviews=Count('id', filter=Q(is_active=True)))
+        .order_by()
+    )
+
+
+def refresh_reviews(cells):
+    """Recount the reviews of the given (movie id, day) rows."""
+    cells = set(cells)
+    if not cells:
+        return
+    days = [day for movie_id, day in cells]
+    reviews = Review.objects.filter(
+        movie_id__in={movie_id for movie_id, day in cells},
+        date__gte=day_start(min(days)),
+        date__lt=day_start(max(days) + timedelta(days=1)),
+    )
+    counts = {
+        (row['movie_id'], row['day']): (row['reviews'], row['active_reviews'])
+        for row in review_counts(reviews)
+    }
+    # rows whose last review went away are reset to nothing
+    MovieDailyStats.objects.bulk_create(
+        [
+            MovieDailyStats(movie_id=movie_id, day=day, reviews=count, active_reviews=active)
+            for (movie_id, day) in cells
+            for count, active in [counts.get((movie_id, day), (0, 0))]
+        ],
+        update_conflicts=True,
+        unique_fields=['movie', 'day'],
+        update_fields=['reviews', 'active_reviews'],
+    )
+
+
+def review_cells(reviews):
+    """The (movie id, day) rows holding the reviews in the ``reviews`` queryset."""
+    # a plain queryset, whatever the annotations of ``reviews``
+    reviews = Review.objects.filter(pk__in=reviews.values('pk'))
+    return reviews.annotate(day=TruncDate('date')).values_list('movie_id', 'day').distinct()
+
+
+def rebuild(since=None):
+    """Recompute the rollups from ``Item`` and ``Review``: all of them, or from day ``since``.
+
+    Runs as one transaction of two INSERT ... SELECT, so the totals never
+    show half rebuilt, but purchases wait for it to finish.
+    """
+    stats = MovieDailyStats.objects.all()
+    items = Item.objects.all()
+    reviews = Review.objects.all()
+    if since:
+        stats = stats.filter(day__gte=since)
+        items = items.filter(order__date__gte=day_start(since))
+        reviews = reviews.filter(date__gte=day_start(since))
+
+    sales = (
+        items.annotate(day=TruncDate('order__date'))
+        .values('movie_id', 'day')
+        .annotate(
+            units=Sum('quantity'), revenue=Sum(F('price') * F('quantity')),
+            reviews=Value(0), active_reviews=Value(0),
+        )
+        .order_by()
+    )
+    with transaction.atomic(using=router.db_for_write(MovieDailyStats)):
+        stats.delete()
+        columns = ['movie_id', 'day', 'units', 'revenue', 'reviews', 'active_reviews']
+        select, params = sales.values_list(*columns).query.sql_with_params()
+        insert(select, params, columns)
+        # model defaults are not the columns' defaults
+        counts = review_counts(reviews).annotate(units=Value(0), revenue=Value(0))
+        select, params = counts.values_list(*columns).query.sql_with_params()
+        # WHERE true: without it SQLite would take ON CONFLICT for the ON of a join
+        insert(f'SELECT * FROM ({select}) WHERE true', params, columns, {
+            'reviews': 'excluded.reviews', 'active_reviews': 'excluded.active_reviews',
+        })
+    connection = connections[router.db_for_write(MovieDailyStats)]
+    if connection.vendor == 'sqlite':
+        # without statistics SQLite ranks by reading every row through the
+        # movie index, rather than just the last days through (movie, day)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(MovieDailyStats._meta.db_table)}')
+    return stats.count()
+
+
+def top_movies(field, days, count):
+    """The ``count`` movies with the highest total ``field`` over the last ``days`` days."""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    ranked = list(
+        MovieDailyStats.objects.filter(day__gte=since)
+        .values('movie_id')
+        .annotate(total=Sum(field))
+        .filter(total__gt=0)
+        .order_by('-total', 'movie_id')
+        .values_list('movie_id', flat=True)[:count]
+    )
+    movies = Movie.objects.in_bulk(ranked)
+    return [movies[movie_id] for movie_id in ranked if movie_id in movies]
+
+
+def home_rankings():
+    """The home page's best sellers and most reviewed movies, cached for PAGE_CACHE_TIMEOUT."""
+    def rank():
+        return {
+            'best_sellers': top_movies('units', settings.BEST_SELLERS_DAYS, settings.HOME_RANKING_SIZE),
+            'trending': top_movies('active_reviews', settings.TRENDING_DAYS, settings.HOME_RANKING_SIZE),
+        }
+    return cache.get_or_set(f'home-rankings:{timezone.localdate()}', rank, settings.PAGE_CACHE_TIMEOUT)
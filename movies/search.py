@@ -0,0 +1,123 @@
+"""Full-text movie search.
+
+On SQLite the catalog is indexed by an FTS5 virtual table that mirrors the
+name and description columns of ``movies_movie``. Triggers created by
+``install_search_index`` keep it in sync on every INSERT/UPDATE/DELETE,
+including bulk and raw writes that bypass model signals. Results are
+ranked by BM25 with matches in the name weighted above the description.
+
+Other database backends (or SQLite builds without FTS5) fall back to a
+case-insensitive substring match over the same two columns.
+"""
+import re
+
+from django.db import DatabaseError, connections, router
+from django.db.models import Q
+
+from .models import Movie
+from .pagination import decode_cursor, encode_cursor, keyset_page
+
+FTS_TABLE = 'movies_movie_fts'
+
+# BM25 column weights: (name, description)
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='movies_movie', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    # make the built-in rank column use the weighted BM25 so FTS5 can
+    # order and limit matches itself
+    f"""INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank)
+        VALUES ('rank', 'bm25({NAME_WEIGHT}, {DESCRIPTION_WEIGHT})')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON movies_movie BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON movies_movie BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON movies_movie BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def install_search_index(schema_editor):
+    """Create the FTS5 table and its triggers, then index the existing rows.
+
+    Safe to run repeatedly. Returns False when the database cannot host the
+    index, in which case searches use the fallback query.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    try:
+        for statement in FTS_SCHEMA:
+            schema_editor.execute(statement)
+    except DatabaseError:
+        # SQLite compiled without FTS5
+        return False
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def match_expression(term):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(term))
+
+
+def search_page(term, cursor, page_size):
+    """Return ``(movies, next_cursor)`` for one page of results for ``term``."""
+    if connections[router.db_for_read(Movie)].vendor == 'sqlite':
+        try:
+            return _fts_page(term, cursor, page_size)
+        except DatabaseError:
+            pass
+    movies = Movie.objects.filter(Q(name__icontains=term) | Q(description__icontains=term))
+    return keyset_page(movies, ['name', 'id'], cursor, page_size)
+
+
+def _fts_page(term, cursor, page_size):
+    expression = match_expression(term)
+    if not expression:
+        return [], None
+
+    after = ''
+    params = [expression]
+    values = decode_cursor(cursor, 2)
+    if values is not None:
+        # BM25 scores are negative with the best match lowest, so pages
+        # walk upwards through (rank, rowid)
+        after = 'AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [values[0], values[0], values[1]]
+    params.append(page_size + 1)
+
+    # rank and limit inside the FTS table first, then join only the page
+    movies = list(Movie.objects.raw(
+        f"""SELECT movies_movie.*, hits.rank AS rank
+            FROM (
+                SELECT rowid, rank FROM {FTS_TABLE}
+                WHERE {FTS_TABLE} MATCH %s {after}
+                ORDER BY rank, rowid
+                LIMIT %s
+            ) AS hits
+            JOIN movies_movie ON movies_movie.id = hits.rowid
+            ORDER BY hits.rank, hits.rowid""",
+        params,
+    ))
+
+    next_cursor = None
+    if len(movies) > page_size:
+        movies = movies[:page_size]
+        next_cursor = encode_cursor([movies[-1].rank, movies[-1].id])
+    return movies, next_cursor
@@ -0,0 +1,49 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from moviesstore.cache import bump
+from tasks.queue import enqueue
+from . import tasks
+from .rollups import refresh_reviews
+from .models import Movie, Review, MoviePetition, PetitionVote
+
+
+@receiver([post_save, post_delete], sender=Movie)
+def invalidate_movie(sender, instance, **kwargs):
+    bump('catalog', f'movie:{instance.id}')
+
+
+@receiver(post_save, sender=Movie)
+def create_thumbnails(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    # resizing takes a while, so a worker does it; the key skips saves that
+    # leave the image as it was
+    enqueue(tasks.create_thumbnails, [instance.image.name], key=f'thumbnails:{instance.image.name}')
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_reviews(sender, instance, **kwargs):
+    bump(f'movie:{instance.movie_id}')
+
+
+@receiver([post_save, post_delete], sender=Review)
+def count_reviews(sender, instance, raw=False, origin=None, **kwargs):
+    if raw:
+        return
+    # the movie's own delete cascades to its rollups and reviews: there is
+    # nothing left to recount, and an upsert would point at a deleted movie
+    if isinstance(origin, Movie) or getattr(origin, 'model', None) is Movie:
+        return
+    refresh_reviews([(instance.movie_id, timezone.localdate(instance.date))])
+
+
+@receiver([post_save, post_delete], sender=MoviePetition)
+def invalidate_petition(sender, instance, **kwargs):
+    bump('petitions', f'petition:{instance.id}')
+
+
+@receiver([post_save, post_delete], sender=PetitionVote)
+def invalidate_petition_votes(sender, instance, **kwargs):
+    bump('petitions', f'petition:{instance.petition_id}')
@@ -0,0 +1,225 @@
+"""Live petition counts for server-sent event streams.
+
+Every event loop serving a stream has a ``PetitionHub``. A stream subscribes
+to its petition and sleeps until the hub hands it new counts, so an idle
+stream costs a coroutine and an ``asyncio.Event`` rather than a thread, and
+one worker can hold thousands of them. The ``VoteBatcher`` publishes the
+counts of every batch it writes to its loop's hub, if there is one. Hubs go
+with their loop: under WSGI every async view call gets a loop of its own.
+
+Votes written elsewhere, by another worker or through the admin, only bump
+the petition's cache version. So while a petition has subscribers the hub
+also polls that version and rereads the counts when it moves; with several
+workers this needs a cache they share (``MOVIESSTORE_CACHE=file``).
+
+A subscriber keeps the latest counts, not a queue of them: a slow client
+skips the states it missed instead of making the worker buffer them.
+
+Django's ASGI handler gives each request an executor thread for its sync
+middleware and keeps it until the response ends, so ``StreamApplication``
+answers the stream URL ahead of Django; ``moviesstore.asgi`` installs it.
+"""
+import asyncio
+import contextvars
+import json
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from moviesstore.cache import version_tag
+from moviesstore.routers import pin_primary
+from .models import MoviePetition
+
+
+def petition_counts(petition_id):
+    """The active petition's ``{'upvotes', 'downvotes'}``, or None."""
+    # a replica may not have the vote that triggered the reread yet
+    pin_primary()
+    return (
+        MoviePetition.objects.filter(id=petition_id, is_active=True)
+        .values('upvotes', 'downvotes')
+        .first()
+    )
+
+
+def format_event(counts):
+    """The SSE event for ``counts``; None closes the stream."""
+    if counts is None:
+        return 'event: closed\ndata: {}\n\n'
+    data = {**counts, 'net_votes': counts['upvotes'] - counts['downvotes']}
+    return f'data: {json.dumps(data)}\n\n'
+
+
+class Subscription:
+    def __init__(self, petition_id):
+        self.petition_id = petition_id
+        self.counts = None
+        self.changed = asyncio.Event()
+
+    def push(self, counts):
+        self.counts = counts
+        self.changed.set()
+
+    async def wait(self, timeout):
+        """Return the latest counts once they change; asyncio.TimeoutError after ``timeout``."""
+        await asyncio.wait_for(self.changed.wait(), timeout)
+        self.changed.clear()
+        return self.counts
+
+
+class PetitionHub:
+    """Fans the counts of petitions out to the streams of one event loop."""
+
+    def __init__(self, loop):
+        # weakly, as the registry's key: holding it would keep both forever
+        self.loop_ref = weakref.ref(loop)
+        self.subscribers = {}
+        self.latest = {}
+        self.watchers = {}
+
+    def subscribe(self, petition_id):
+        subscription = Subscription(petition_id)
+        self.subscribers.setdefault(petition_id, set()).add(subscription)
+        if petition_id not in self.watchers:
+            self.watchers[petition_id] = self.loop_ref().create_task(
+                self.watch(petition_id), context=contextvars.Context(),
+            )
+        return subscription
+
+    def unsubscribe(self, subscription):
+        petition_id = subscription.petition_id
+        subscribers = self.subscribers[petition_id]
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self.subscribers[petition_id]
+            self.latest.pop(petition_id, None)
+            self.watchers.pop(petition_id).cancel()
+
+    def publish(self, petition_id, counts):
+        """Hand ``counts`` to the petition's subscribers, if they are news."""
+        if petition_id not in self.subscribers:
+            return
+        if petition_id in self.latest and self.latest[petition_id] == counts:
+            return
+        self.latest[petition_id] = counts
+        for subscription in self.subscribers[petition_id]:
+            subscription.push(counts)
+
+    async def watch(self, petition_id):
+        scope = f'petition:{petition_id}'
+        seen = await sync_to_async(version_tag)(scope)
+        while True:
+            await asyncio.sleep(settings.PETITION_STREAM_POLL_SECONDS)
+            current = await sync_to_async(version_tag)(scope)
+            if current != seen:
+                seen = current
+                self.publish(petition_id, await sync_to_async(petition_counts)(petition_id))
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub(loop=None, create=True):
+    """The hub of ``loop``, by default the running one.
+
+    Without ``create``, None if the loop has no hub yet.
+    """
+    loop = loop or asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None and create:
+        hub = _hubs[loop] = PetitionHub(loop)
+    return hub
+
+
+async def petition_events(petition_id):
+    """Yield SSE events with the petition's counts, now and whenever they change."""
+    hub = get_hub()
+    subscription = hub.subscribe(petition_id)
+    try:
+        # read after subscribing, so no change falls in between
+        counts = await sync_to_async(petition_counts)(petition_id)
+        yield f'retry: {int(settings.PETITION_STREAM_POLL_SECONDS * 1000)}\n' + format_event(counts)
+        while counts is not None:
+            try:
+                counts = await subscription.wait(settings.PETITION_STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                # keeps proxies from closing the connection, and finds dead clients
+                yield ': keepalive\n\n'
+            else:
+                yield format_event(counts)
+    finally:
+        hub.unsubscribe(subscription)
+
+
+class StreamApplication:
+    """ASGI middleware serving ``movies.petition_stream`` without Django's handler.
+
+    Everything else, including the 404 for a missing petition, goes on to
+    the wrapped application.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        petition_id = self.petition_id(scope)
+        counts = None
+        if petition_id is not None:
+            counts = await sync_to_async(petition_counts)(petition_id)
+        if counts is None:
+            return await self.app(scope, receive, send)
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                # stop proxies buffering the events
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+
+        async def stream():
+            events = petition_events(petition_id)
+            try:
+                async for event in events:
+                    await send({'type': 'http.response.body', 'body': event.encode(), 'more_body': True})
+            finally:
+                # unsubscribes, even when cancelled during a send
+                await events.aclose()
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        streaming = asyncio.ensure_future(stream())
+        waiting = asyncio.ensure_future(disconnected())
+        try:
+            await asyncio.wait({streaming, waiting}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            streaming.cancel()
+            waiting.cancel()
+            # the stream unsubscribes before the connection counts as done
+            outcome, _ = await asyncio.gather(streaming, waiting, return_exceptions=True)
+        if isinstance(outcome, Exception):
+            raise outcome
+
+    def petition_id(self, scope):
+        """The petition whose stream ``scope`` asks for, or None."""
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            return None
+        path = scope['path']
+        root_path = scope.get('root_path', '')
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return None
+        if match.url_name != 'movies.petition_stream':
+            return None
+        return match.kwargs['petition_id']
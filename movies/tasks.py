@@ -0,0 +1,43 @@
+"""Slow side effects of catalog and review changes, run by the task queue."""
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from tasks.queue import task
+from .images import generate_thumbnails
+from .models import Report
+from .rollups import refresh_reviews
+
+
+@task
+def create_thumbnails(image_name):
+    # an upload not in storage yet raises OSError and is retried
+    generate_thumbnails(image_name)
+
+
+@task
+def notify_moderators(report_id):
+    """Email the staff about a newly reported review."""
+    report = Report.objects.select_related('review__movie', 'review__user', 'reporter').filter(id=report_id).first()
+    if report is None:
+        return
+    recipients = list(
+        User.objects.filter(is_staff=True, is_active=True).exclude(email='').values_list('email', flat=True)
+    )
+    if not recipients:
+        return
+    body = render_to_string('movies/emails/report.txt', {
+        'report': report,
+        'open_reports': Report.objects.filter(resolved=False).count(),
+        'queue_url': reverse('admin:movies_reportedreview_changelist'),
+    })
+    send_mail(f'Review reported on {report.review.movie.name}', body, None, recipients)
+
+
+@task
+def refresh_review_stats(cells):
+    """Recount the review rollups of the given [movie id, ISO day] pairs."""
+    refresh_reviews((movie_id, date.fromisoformat(day)) for movie_id, day in cells)
@@ -0,0 +1,21 @@
+from django import template
+from django.utils.html import format_html
+
+from movies.images import srcset
+
+register = template.Library()
+
+@register.simple_tag
+def movie_poster(movie, css_class, sizes):
+    """Render a movie's poster as a <picture> preferring the resized derivatives."""
+    image = movie.image
+    webp = srcset(image.name, 'webp')
+    if not webp:
+        return format_html('<img src="{}" class="{}" loading="lazy">', image.url, css_class)
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" class="{}" loading="lazy">'
+        '</picture>',
+        webp, sizes, image.url, srcset(image.name, 'jpeg'), sizes, css_class,
+    )
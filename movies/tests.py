@@ -1,3 +1,313 @@
-from django.test import TestCase
+import asyncio
+import gc
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.core.cache import cache
+from django.db import connection
+from django.http import Http404
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from moviesstore.cache import versions
+from tasks.queue import claim, execute
+
+from .images import available_widths
+from .streams import _hubs, get_hub
+from .titles import similar_titles
+from .votes import _batchers, apply_votes, submit_vote
+from .models import Movie, MovieDailyStats, MoviePetition, PetitionVote, Review
+
+
+class DeleteMovieTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reviewer')
+        self.movie = Movie.objects.create(name='Heat', price=5, description='A heist.')
+        Review.objects.create(movie=self.movie, user=self.user, comment='Great')
+        Review.objects.create(movie=self.movie, user=self.user, comment='Long')
+
+    def test_delete_movie_with_reviews(self):
+        self.movie.delete()
+        self.assertFalse(Movie.objects.exists())
+        self.assertFalse(MovieDailyStats.objects.exists())
+
+    def test_delete_movies_queryset_with_reviews(self):
+        Movie.objects.filter(id=self.movie.id).delete()
+        self.assertFalse(Review.objects.exists())
+
+    def test_delete_review_recounts(self):
+        Review.objects.filter(comment='Long').get().delete()
+        self.assertEqual(MovieDailyStats.objects.get(movie=self.movie).reviews, 1)
+
+
+class AdminActionTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin')
+        self.client.force_login(self.admin)
+        self.movie = Movie.objects.create(name='Heat', price=5, description='A heist.')
+        self.review = Review.objects.create(movie=self.movie, user=self.admin, comment='Great')
+        self.petition = MoviePetition.objects.create(
+            title='Ronin', description='Another heist.', petitioner=self.admin,
+        )
+
+    def act(self, url, action, obj):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'action': action, '_selected_action': [obj.id]})
+
+    def test_hide_reviews_on_filtered_changelist_bumps_movie(self):
+        scope = f'movie:{self.movie.id}'
+        [before] = versions(scope)
+        self.act('/admin/movies/review/?is_active__exact=1', 'hide_reviews', self.review)
+        self.review.refresh_from_db()
+        self.assertFalse(self.review.is_active)
+        self.assertNotEqual(versions(scope), [before])
+
+    def test_hide_reviews_on_filtered_changelist_recounts(self):
+        self.act('/admin/movies/review/?is_active__exact=1', 'hide_reviews', self.review)
+        # in this thread: the test database is not shared with worker threads
+        for task in claim('test', 10):
+            execute(task)
+        self.assertEqual(MovieDailyStats.objects.get(movie=self.movie).active_reviews, 0)
+
+    def test_deactivate_petitions_on_filtered_changelist_bumps_petition(self):
+        scopes = ('petitions', f'petition:{self.petition.id}')
+        before = versions(*scopes)
+        self.act('/admin/movies/moviepetition/?is_active__exact=1', 'deactivate_petitions', self.petition)
+        self.petition.refresh_from_db()
+        self.assertFalse(self.petition.is_active)
+        self.assertNotEqual(versions(*scopes)[1], before[1])
+
+
+class AvailableWidthsTests(TestCase):
+    def test_missing_derivatives_are_not_cached(self):
+        self.assertEqual(available_widths('movie_images/queued.jpg'), [])
+        self.assertIsNone(cache.get('thumbnails:movie_images/queued.jpg'))
+
+
+class PetitionListQueriesTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user('viewer')
+
+    def add_petitions(self, count):
+        for _ in range(count):
+            n = MoviePetition.objects.count()
+            petitioner = User.objects.create_user(f'petitioner{n}')
+            petition = MoviePetition.objects.create(
+                title=f'Petition {n}', description='Please add it.', petitioner=petitioner,
+            )
+            PetitionVote.objects.create(petition=petition, voter=self.viewer, vote_type=n % 2 == 0)
+
+    def assertConstantQueries(self):
+        self.add_petitions(1)
+        # rendered pages are cached for visitors
+        cache.clear()
+        with CaptureQueriesContext(connection) as one:
+            self.assertContains(self.client.get('/movies/petitions/'), 'Petition 0')
+        self.add_petitions(19)
+        cache.clear()
+        with self.assertNumQueries(len(one)):
+            self.assertContains(self.client.get('/movies/petitions/'), 'Petition 19')
+
+    def test_anonymous(self):
+        self.assertConstantQueries()
+
+    def test_logged_in(self):
+        self.client.force_login(self.viewer)
+        self.assertConstantQueries()
+
+
+class SimilarTitlesTests(TestCase):
+    def setUp(self):
+        for name in ('Avatar', 'Inception', 'Avengers', 'Heat'):
+            Movie.objects.create(name=name, price=5, description='A movie.')
+
+    def assertSuggests(self, typed, name):
+        petitions, movies = similar_titles(typed)
+        self.assertIn(name, [movie.name for movie in movies])
+
+    def test_misspelt_title(self):
+        self.assertSuggests('Avatr', 'Avatar')
+        self.assertSuggests('Inceptoin', 'Inception')
+
+    def test_longer_title(self):
+        self.assertSuggests('Avengers Endgame', 'Avengers')
+
+    def test_closed_petitions_do_not_crowd_out_open_ones(self):
+        petitioner = User.objects.create_user('petitioner')
+        MoviePetition.objects.bulk_create([
+            MoviePetition(title='Ronin', description='Closed.', petitioner=petitioner, is_active=False)
+            for _ in range(60)
+        ])
+        MoviePetition.objects.create(title='Ronin Returns', description='Open.', petitioner=petitioner)
+        petitions, movies = similar_titles('Ronin')
+        self.assertEqual([petition.title for petition in petitions], ['Ronin Returns'])
+
+    def test_unrelated_title(self):
+        self.assertEqual(similar_titles('Casablanca'), ([], []))
+
+
+class PetitionCreateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('petitioner')
+        self.client.force_login(self.user)
+
+    def test_own_short_title_is_blocked(self):
+        MoviePetition.objects.create(title='Up', description='Balloons.', petitioner=self.user)
+        response = self.client.post('/movies/petitions/create/', {
+            'title': 'up', 'description': 'Balloons again.', 'confirm': '1',
+        })
+        self.assertContains(response, 'You already have an active petition with this title.')
+        self.assertEqual(MoviePetition.objects.count(), 1)
+
+    def test_own_similar_title_can_be_confirmed(self):
+        MoviePetition.objects.create(title='Alien', description='In space.', petitioner=self.user)
+        data = {'title': 'Aliens', 'description': 'The sequel.'}
+        response = self.client.post('/movies/petitions/create/', data)
+        self.assertContains(response, 'Submit Anyway')
+        self.client.post('/movies/petitions/create/', {**data, 'confirm': '1'})
+        self.assertTrue(MoviePetition.objects.filter(title='Aliens').exists())
+
+
+class LoopRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        petitioner = User.objects.create_user('petitioner')
+        self.voter = User.objects.create_user('voter')
+        self.petition = MoviePetition.objects.create(
+            title='Ronin', description='A heist.', petitioner=petitioner,
+        )
+        self.client.force_login(self.voter)
+
+    def vote(self, vote):
+        return self.client.post(f'/movies/petitions/{self.petition.id}/vote/', {'vote': vote})
+
+    def vote_a_few_times(self):
+        # each request to an async view runs on a loop of its own under WSGI
+        for vote in ['up', 'down', 'none', 'up', 'down']:
+            self.assertEqual(self.vote(vote).json()['status'], 'success')
+        gc.collect()
+
+    def test_idle_batchers_are_dropped(self):
+        self.vote_a_few_times()
+        self.assertEqual(len(_batchers), 0)
+
+    def test_votes_create_no_hubs(self):
+        self.vote_a_few_times()
+        self.assertEqual(len(_hubs), 0)
+
+    def test_hubs_are_freed_with_their_loops(self):
+        async def stream_briefly():
+            hub = get_hub()
+            hub.unsubscribe(hub.subscribe(self.petition.id))
+
+        asyncio.run(stream_briefly())
+        gc.collect()
+        self.assertEqual(len(_hubs), 0)
+
+
+class CreateReviewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reviewer')
+        self.client.force_login(self.user)
+        self.movie = Movie.objects.create(name='Heat', price=5, description='A heist.')
+        self.url = f'/movies/{self.movie.id}/review/create/'
+
+    def test_gets_use_no_review_budget(self):
+        for _ in range(10):
+            self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.client.post(self.url, {'comment': 'Great'})
+        self.assertTrue(Review.objects.filter(movie=self.movie, comment='Great').exists())
+
+
+class PetitionSuggestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('petitioner')
+        self.client.force_login(self.user)
+        Movie.objects.create(name='Avatar', price=5, description='Blue.')
+
+    def suggest(self, title):
+        response = self.client.get('/movies/petitions/suggest/', {'q': title})
+        return [movie['name'] for movie in response.json()['movies']]
+
+    def test_suggestions_are_cached_per_title(self):
+        self.assertEqual(self.suggest('Avatr'), ['Avatar'])
+        with mock.patch('movies.views.similar_titles') as similar_titles:
+            self.assertEqual(self.suggest('  AVATR! '), ['Avatar'])
+        similar_titles.assert_not_called()
+
+    def test_new_movies_are_suggested(self):
+        self.suggest('Avatr')
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.create(name='Avatar 2', price=5, description='Bluer.')
+        self.assertEqual(sorted(self.suggest('Avatr')), ['Avatar', 'Avatar 2'])
+
+    @override_settings(RATE_LIMITS={'suggest': {'user': (2, 60)}})
+    def test_rate_limited(self):
+        self.suggest('Avatr')
+        self.suggest('Avatar')
+        response = self.client.get('/movies/petitions/suggest/', {'q': 'Avat'})
+        self.assertEqual(response.status_code, 429)
+
+
+class ApplyVotesTests(TestCase):
+    def setUp(self):
+        self.petitioner, self.ann, self.bob = [
+            User.objects.create_user(name) for name in ('petitioner', 'ann', 'bob')
+        ]
+        self.petition = MoviePetition.objects.create(
+            title='Ronin', description='A heist.', petitioner=self.petitioner,
+        )
+
+    def votes(self):
+        return dict(PetitionVote.objects.values_list('voter__username', 'vote_type'))
+
+    def test_latest_vote_of_a_voter_wins(self):
+        p = self.petition.id
+        results = apply_votes([(p, self.ann.id, True), (p, self.bob.id, True), (p, self.ann.id, False)])
+        self.assertEqual(self.votes(), {'ann': False, 'bob': True})
+        self.assertEqual(results, [{'upvotes': 1, 'downvotes': 1}] * 3)
+
+    def test_withdrawn_vote(self):
+        p = self.petition.id
+        apply_votes([(p, self.ann.id, True)])
+        self.assertEqual(apply_votes([(p, self.ann.id, None)]), [{'upvotes': 0, 'downvotes': 0}])
+        self.assertEqual(self.votes(), {})
+
+    def test_counters_are_recounted(self):
+        MoviePetition.objects.filter(id=self.petition.id).update(upvotes=99, downvotes=99)
+        apply_votes([(self.petition.id, self.ann.id, True)])
+        self.petition.refresh_from_db()
+        self.assertEqual((self.petition.upvotes, self.petition.downvotes), (1, 0))
+
+    def test_refused_votes(self):
+        closed = MoviePetition.objects.create(
+            title='Heat', description='Closed.', petitioner=self.petitioner, is_active=False,
+        )
+        own, missing = apply_votes([
+            (self.petition.id, self.petitioner.id, True),
+            (closed.id, self.ann.id, True),
+        ])
+        self.assertIsInstance(own, PermissionDenied)
+        self.assertIsInstance(missing, Http404)
+        self.assertEqual(self.votes(), {})
+
+    def test_concurrent_votes_are_written_together(self):
+        p = self.petition.id
+
+        async def vote():
+            return await asyncio.gather(
+                submit_vote(p, self.ann.id, True),
+                submit_vote(p, self.bob.id, False),
+                submit_vote(p, self.ann.id, None),
+            )
+
+        with mock.patch('movies.votes.apply_votes', wraps=apply_votes) as write:
+            results = async_to_sync(vote)()
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(results, [{'upvotes': 0, 'downvotes': 1}] * 3)
+        self.assertEqual(self.votes(), {'bob': False})
+        self.assertEqual(len(_batchers), 0)
@@ -0,0 +1,207 @@
+"""Trigram matching of petition titles against petitions and catalog movies.
+
+On SQLite two FTS5 tables with the ``trigram`` tokenizer index the titles
+of ``movies_moviepetition`` and the names of ``movies_movie``, kept in sync
+by triggers like the search index of ``movies.search``. Their UPDATE
+triggers only fire on a change of the indexed column, so the vote counters
+a petition is updated with on every vote do not touch them.
+
+Looking a title up is two steps. The index finds the titles holding at
+least two of the typed words, or any of them when fewer than three are
+typed, best BM25 first. That intersects the postings of a few words, where
+matching any of the title's trigrams would read a share of every title.
+A misspelt word is made up for by the others; when that finds fewer than
+TITLE_SUGGESTIONS titles, as for a single misspelt word, titles sharing any
+trigram of the typed words are read too. The few best are then scored in
+Python on the trigrams of their words: how much of the shorter of both
+titles the other contains, which already tells while the user is still
+typing and when they type more than the title, and their overlap, which
+orders them (``score``).
+
+Other database backends, or SQLite builds without the trigram tokenizer,
+fall back to the same word match with substring lookups.
+"""
+import itertools
+import re
+from functools import reduce
+from operator import and_, or_
+
+from django.conf import settings
+from django.db import DatabaseError, connections, router
+from django.db.models import Q
+
+from .models import Movie, MoviePetition
+
+PETITION_TABLE = 'movies_moviepetition_trigram'
+MOVIE_TABLE = 'movies_movie_trigram'
+
+# rows read from an index per lookup, before scoring
+CANDIDATES = 50
+
+# titles are looked up by their first characters only, and by their
+# longest words, which are the rarest
+MAX_LENGTH = 100
+MAX_WORDS = 6
+
+
+def trigram_schema(table, content, column):
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+            {column}, content='{content}', content_rowid='id', tokenize='trigram'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {content} BEGIN
+            INSERT INTO {table}(rowid, {column}) VALUES (new.id, new.{column});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {content} BEGIN
+            INSERT INTO {table}({table}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {column} ON {content} BEGIN
+            INSERT INTO {table}({table}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+            INSERT INTO {table}(rowid, {column}) VALUES (new.id, new.{column});
+        END""",
+    ]
+
+
+TRIGRAM_INDEXES = {
+    PETITION_TABLE: trigram_schema(PETITION_TABLE, 'movies_moviepetition', 'title'),
+    MOVIE_TABLE: trigram_schema(MOVIE_TABLE, 'movies_movie', 'name'),
+}
+
+WORD_RE = re.compile(r'\w+')
+
+
+def install_title_indexes(schema_editor):
+    """Create the trigram tables and their triggers, then index the existing rows.
+
+    Safe to run repeatedly. Returns False when the database cannot host
+    them, in which case lookups use the fallback query.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    try:
+        for statements in TRIGRAM_INDEXES.values():
+            for statement in statements:
+                schema_editor.execute(statement)
+    except DatabaseError:
+        # SQLite without FTS5, or older than 3.34 and its trigram tokenizer
+        return False
+    for table in TRIGRAM_INDEXES:
+        schema_editor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+    return True
+
+
+def normalize(text):
+    return ' '.join(WORD_RE.findall(text[:MAX_LENGTH].lower()))
+
+
+def trigrams(text):
+    """The trigrams of the words of ``text``, each padded like pg_trgm's."""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def score(typed, title):
+    """(containment, similarity) of ``title`` to the trigrams ``typed``.
+
+    Containment is the share of the smaller set of trigrams found in the
+    other, similarity the Jaccard index of both sets.
+    """
+    grams = trigrams(title)
+    if not grams:
+        return 0, 0
+    common = len(typed & grams)
+    return common / min(len(typed), len(grams)), common / len(typed | grams)
+
+
+def words(text):
+    # the index cannot find anything shorter than a trigram
+    found = list(dict.fromkeys(word for word in normalize(text).split() if len(word) >= 3))
+    return sorted(found, key=len, reverse=True)[:MAX_WORDS]
+
+
+def word_groups(text):
+    """The groups of words of ``text`` of which a title must hold one group."""
+    found = words(text)
+    if len(found) < 3:
+        return [[word] for word in found]
+    return [list(pair) for pair in itertools.combinations(found, 2)]
+
+
+def trigram_groups(text):
+    """The trigrams of the words of ``text``, of which a title must hold one."""
+    grams = {word[i:i + 3] for word in words(text) for i in range(len(word) - 2)}
+    return [[gram] for gram in sorted(grams)]
+
+
+def match_expression(groups):
+    return ' OR '.join('(' + ' AND '.join(f'"{word}"' for word in group) + ')' for group in groups)
+
+
+def candidates(model, table, column, text, **filters):
+    rows = lookup(model, table, column, word_groups(text), filters)
+    if len(rows) < settings.TITLE_SUGGESTIONS:
+        seen = {row.id for row in rows}
+        rows += [
+            row for row in lookup(model, table, column, trigram_groups(text), filters)
+            if row.id not in seen
+        ]
+    return rows
+
+
+def lookup(model, table, column, groups, filters):
+    """Up to CANDIDATES rows matching ``filters`` with every word of a group in ``column``."""
+    if not groups:
+        return []
+    connection = connections[router.db_for_read(model)]
+    if connection.vendor == 'sqlite':
+        expression = match_expression(groups)
+        db_table = model._meta.db_table
+        # filtered before the limit, so rows left out cannot crowd out matches
+        conditions = ''.join(
+            f' AND {db_table}.{connection.ops.quote_name(model._meta.get_field(name).column)} = %s'
+            for name in filters
+        )
+        try:
+            return list(model.objects.raw(
+                f"""SELECT {db_table}.* FROM {table}
+                    JOIN {db_table} ON {db_table}.id = {table}.rowid
+                    WHERE {table} MATCH %s{conditions}
+                    ORDER BY {table}.rank
+                    LIMIT %s""",
+                [expression, *filters.values(), CANDIDATES],
+            ))
+        except DatabaseError:
+            pass
+    matches = reduce(or_, [
+        reduce(and_, [Q(**{f'{column}__icontains': word}) for word in group]) for group in groups
+    ])
+    return list(model.objects.filter(matches, **filters)[:CANDIDATES])
+
+
+def best(rows, column, typed, limit):
+    """The ``rows`` containing enough of ``typed``, most similar first, scores attached."""
+    matches = []
+    for row in rows:
+        row.containment, row.similarity = score(typed, getattr(row, column))
+        if row.containment >= settings.TITLE_MATCH_THRESHOLD:
+            matches.append(row)
+    matches.sort(key=lambda row: (-row.similarity, -row.containment, row.id))
+    return matches[:limit]
+
+
+def similar_titles(text, limit=None):
+    """Active petitions and catalog movies whose titles look like ``text``.
+
+    Returns ``(petitions, movies)``, each the best TITLE_SUGGESTIONS at most,
+    most similar first, with ``containment`` and ``similarity`` attributes.
+    """
+    limit = limit or settings.TITLE_SUGGESTIONS
+    typed = trigrams(text)
+    if not typed:
+        return [], []
+    petitions = candidates(MoviePetition, PETITION_TABLE, 'title', text, is_active=True)
+    movies = candidates(Movie, MOVIE_TABLE, 'name', text)
+    return best(petitions, 'title', typed, limit), best(movies, 'name', typed, limit)
@@ -1,39 +1,119 @@
+import hashlib
+
 from django.shortcuts import render, redirect, get_object_or_404
 from .models import Movie, Review, Report, MoviePetition, PetitionVote
+from .pagination import keyset_page, LazyKeysetPage
+from .search import search_page
+from .titles import normalize, similar_titles
+from .recommendations import similar_movies
+from .images import srcset
+from .votes import submit_vote
+from .streams import format_event, petition_counts
+from .tasks import notify_moderators
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import Http404, HttpResponse, JsonResponse, HttpResponseForbidden
+from django.core.exceptions import PermissionDenied
 from django.contrib import messages
-from django.db import transaction
-from django.db.models import Count
+from django.db.models import F, OuterRef, Subquery
+from django.urls import reverse
+from django.utils.formats import date_format
+from django.utils.timezone import localtime
+from django.conf import settings
+from django.core.cache import cache
+from moviesstore.cache import cache_anonymous, version_tag
+from moviesstore.ratelimit import rate_limit
+from tasks.queue import enqueue
+from moviesstore.db import atomic_with_retry
 
-def index(request):
+MOVIES_PAGE_SIZE = 24
+REVIEWS_PAGE_SIZE = 20
+
+
+def movie_page(request):
+    """Return one keyset-paginated page of the catalog or search results."""
     search_term = request.GET.get('search')
+    cursor = request.GET.get('cursor')
     if search_term:
-        movies = Movie.objects.filter(name__icontains=search_term)
-    else:
-        movies = Movie.objects.all()
+        return search_page(search_term, cursor, MOVIES_PAGE_SIZE)
+    return keyset_page(Movie.objects.all(), ['name', 'id'], cursor, MOVIES_PAGE_SIZE)
+
+@cache_anonymous('catalog')
+def index(request):
+    movies, next_cursor = movie_page(request)
 
     template_data = {}
     template_data['title'] = 'Movies'
     template_data['movies'] = movies
+    template_data['search_term'] = request.GET.get('search', '')
+    template_data['next_cursor'] = next_cursor
     return render(request, 'movies/index.html', {'template_data': template_data})
 
+@cache_anonymous('catalog')
+def index_page(request):
+    """JSON variant of the catalog page, used for infinite scrolling."""
+    movies, next_cursor = movie_page(request)
+    return JsonResponse({
+        'movies': [
+            {
+                'id': movie.id,
+                'name': movie.name,
+                'url': reverse('movies.show', args=[movie.id]),
+                'image': movie.image.url,
+                'srcset': srcset(movie.image.name, 'jpeg'),
+            }
+            for movie in movies
+        ],
+        'next_cursor': next_cursor,
+    })
+
+def review_page(request, movie):
+    """Newest-first page of a movie's active reviews, with their authors."""
+    reviews = Review.objects.filter(movie=movie, is_active=True).select_related('user')
+    return LazyKeysetPage(reviews, ['-date', '-id'], request.GET.get('cursor'), REVIEWS_PAGE_SIZE)
+
 def show(request, id):
-    movie = Movie.objects.get(id=id)
-    # only show active reviews
-    reviews = Review.objects.filter(movie=movie, is_active=True)
+    movie = get_object_or_404(Movie, id=id)
 
     template_data = {}
     template_data['title'] = movie.name
     template_data['movie'] = movie
-    template_data['reviews'] = reviews
+    template_data['reviews'] = review_page(request, movie)
+    template_data['also_bought'] = similar_movies(movie)
+    template_data['reviews_version'] = version_tag(f'movie:{movie.id}')
+    template_data['cursor'] = request.GET.get('cursor', '')
+    template_data['cache_timeout'] = settings.PAGE_CACHE_TIMEOUT
     return render(request, 'movies/show.html', {'template_data': template_data})
 
+@cache_anonymous('movie:{id}')
+def reviews(request, id):
+    """JSON page of reviews for the "load more" button on the movie page."""
+    movie = get_object_or_404(Movie, id=id)
+    page = review_page(request, movie)
+    return JsonResponse({
+        'reviews': [
+            {
+                'id': review.id,
+                'user': review.user.username,
+                'date': date_format(localtime(review.date), 'DATETIME_FORMAT'),
+                'comment': review.comment,
+                'is_author': review.user_id == request.user.id,
+                'edit_url': reverse('movies.edit_review', args=[movie.id, review.id]),
+                'delete_url': reverse('movies.delete_review', args=[movie.id, review.id]),
+                'report_url': reverse('movies.report_review', args=[movie.id, review.id]),
+            }
+            for review in page
+        ],
+        'next_cursor': page.next_cursor,
+    })
+
 @login_required
+@require_POST
+@rate_limit('review')
 def create_review(request, id):
-    if request.method == 'POST' and request.POST['comment'] != '':
-        movie = Movie.objects.get(id=id)
+    if request.POST.get('comment', '') != '':
+        movie = get_object_or_404(Movie, id=id)
         review = Review()
         review.comment = request.POST['comment']
         review.movie = movie
@@ -69,8 +149,17 @@ def delete_review(request, id, review_id):
     return redirect('movies.show', id=id)
 
 
+@atomic_with_retry
+def file_report(review, reporter, reason):
+    report = Report.objects.create(review=review, reporter=reporter, reason=reason)
+    # hide immediately on first report
+    review.hide()
+    enqueue(notify_moderators, [report.id])
+
+
 @login_required
 @require_POST
+@rate_limit('report')
 def report_review(request, id, review_id):
     """Allow authenticated users to report a review. The first report hides the review immediately."""
     review = get_object_or_404(Review, id=review_id, movie__id=id)
@@ -85,10 +174,7 @@ def report_review(request, id, review_id):
         messages.info(request, 'You have already reported this review.')
         return redirect('movies.show', id=id)
 
-    with transaction.atomic():
-        Report.objects.create(review=review, reporter=request.user, reason=request.POST.get('reason', ''))
-        # hide immediately on first report
-        review.hide()
+    file_report(review, request.user, request.POST.get('reason', ''))
 
     messages.success(request, 'Thank you — the review has been reported and removed.')
     return redirect('movies.show', id=id)
@@ -96,17 +182,22 @@ def report_review(request, id, review_id):
 
 # Movie Petition Views
 
+@cache_anonymous('petitions')
 def petition_list(request):
-    """Display all active movie petitions ordered by vote count."""
-    petitions = MoviePetition.objects.filter(is_active=True).annotate(
-        vote_count=Count('votes')
-    ).order_by('-vote_count', '-created_at')
+    """Display all active movie petitions ordered by net votes."""
+    petitions = MoviePetition.objects.filter(is_active=True).select_related(
+        'petitioner'
+    ).annotate(
+        net_votes=F('upvotes') - F('downvotes')
+    ).order_by('-net_votes', '-created_at')
     
-    # Add vote info for each petition if user is authenticated
+    # Attach the current user's vote in the same statement
     if request.user.is_authenticated:
-        for petition in petitions:
-            user_vote = petition.votes.filter(voter=request.user).first()
-            petition.user_vote = user_vote.vote_type if user_vote else None
+        user_votes = PetitionVote.objects.filter(
+            petition=OuterRef('pk'),
+            voter=request.user
+        ).values('vote_type')[:1]
+        petitions = petitions.annotate(user_vote=Subquery(user_votes))
     
     template_data = {
         'title': 'Movie Petitions',
@@ -117,24 +208,45 @@ def petition_list(request):
 
 @login_required
 def petition_create(request):
-    """Allow authenticated users to create new movie petitions."""
+    """Allow authenticated users to create new movie petitions.
+
+    A title like an active petition or a catalog movie comes back with
+    those listed, to vote for or buy instead. The user can still submit it,
+    unless they have an active petition with the same title.
+    """
     if request.method == 'POST':
         title = request.POST.get('title', '').strip()
         description = request.POST.get('description', '').strip()
         
         if title and description:
-            # Check if user already has a petition with similar title
-            existing = MoviePetition.objects.filter(
+            petitions, movies = similar_titles(title)
+            template_data = {
+                'title': 'Create Movie Petition',
+                'similar_petitions': petitions,
+                'similar_movies': movies,
+            }
+            form_data = {'title': title, 'description': description}
+
+            # similar titles may well be other movies, such as "Aliens" after
+            # "Alien", so only the same title again is refused
+            if MoviePetition.objects.filter(
                 petitioner=request.user,
-                title__icontains=title,
+                title__iexact=title,
                 is_active=True
-            ).exists()
-            
-            if existing:
-                messages.warning(request, 'You already have a similar petition active.')
+            ).exists():
+                messages.warning(request, 'You already have an active petition with this title.')
+                return render(request, 'movies/petition_create.html', {
+                    'template_data': template_data,
+                    'form_data': form_data
+                })
+
+            if (petitions or movies) and not request.POST.get('confirm'):
+                messages.info(request, 'This looks like a petition or movie we already have. '
+                                       'Vote for it instead, or submit yours anyway.')
+                template_data['confirm'] = True
                 return render(request, 'movies/petition_create.html', {
-                    'template_data': {'title': 'Create Movie Petition'},
-                    'form_data': {'title': title, 'description': description}
+                    'template_data': template_data,
+                    'form_data': form_data
                 })
             
             petition = MoviePetition.objects.create(
@@ -151,9 +263,52 @@ def petition_create(request):
     return render(request, 'movies/petition_create.html', {'template_data': template_data})
 
 
+@rate_limit('suggest')
+def petition_suggest(request):
+    """JSON petitions and catalog movies like the title typed so far, for the create form.
+
+    The answer for a title is cached until a petition or movie changes.
+    """
+    title = normalize(request.GET.get('q', ''))
+    key = 'petition-suggest:{}:{}'.format(
+        version_tag('catalog', 'petitions'), hashlib.md5(title.encode()).hexdigest()
+    )
+    suggestions = cache.get(key)
+    if suggestions is None:
+        suggestions = similar_suggestions(title)
+        cache.set(key, suggestions, settings.PAGE_CACHE_TIMEOUT)
+    return JsonResponse(suggestions)
+
+
+def similar_suggestions(title):
+    petitions, movies = similar_titles(title)
+    return {
+        'petitions': [
+            {
+                'id': petition.id,
+                'title': petition.title,
+                'url': reverse('movies.petition_detail', args=[petition.id]),
+                'votes': petition.upvotes - petition.downvotes,
+            }
+            for petition in petitions
+        ],
+        'movies': [
+            {
+                'id': movie.id,
+                'name': movie.name,
+                'url': reverse('movies.show', args=[movie.id]),
+            }
+            for movie in movies
+        ],
+    }
+
+
+@cache_anonymous('petition:{petition_id}')
 def petition_detail(request, petition_id):
     """Display detailed view of a single petition."""
-    petition = get_object_or_404(MoviePetition, id=petition_id, is_active=True)
+    petition = get_object_or_404(
+        MoviePetition.objects.select_related('petitioner'), id=petition_id, is_active=True
+    )
     
     # Get user's vote if authenticated
     user_vote = None
@@ -172,61 +327,63 @@ def petition_detail(request, petition_id):
     return render(request, 'movies/petition_detail.html', {'template_data': template_data})
 
 
-@login_required
+# vote values posted by the voting widget
+VOTE_CHOICES = {'up': True, 'down': False, 'none': None}
+
+
 @require_POST
-def petition_vote(request, petition_id):
-    """Handle AJAX voting on petitions."""
-    petition = get_object_or_404(MoviePetition, id=petition_id, is_active=True)
-    
-    # Prevent voting on own petition
-    if petition.petitioner == request.user:
+@rate_limit('vote')
+async def petition_vote(request, petition_id):
+    """Set the user's vote on a petition (AJAX).
+
+    ``vote`` is the state the user wants, ``up``, ``down`` or ``none``,
+    rather than a toggle, so the page can collapse a burst of clicks into
+    one request and a repeated request changes nothing.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
         return JsonResponse({
             'status': 'error',
-            'message': 'You cannot vote on your own petition.'
-        })
-    
-    vote_type_str = request.POST.get('vote_type')
-    if vote_type_str not in ['true', 'false']:
+            'message': 'Please log in to vote.'
+        }, status=401)
+
+    vote = request.POST.get('vote')
+    if vote not in VOTE_CHOICES:
         return JsonResponse({
             'status': 'error',
             'message': 'Invalid vote type.'
         })
-    
-    vote_type = vote_type_str == 'true'
-    
-    with transaction.atomic():
-        # Get or create vote
-        vote, created = PetitionVote.objects.get_or_create(
-            petition=petition,
-            voter=request.user,
-            defaults={'vote_type': vote_type}
-        )
-        
-        current_user_vote = None
-        
-        if not created:
-            # User already voted, update their vote
-            if vote.vote_type == vote_type:
-                # Same vote - remove it (toggle off)
-                vote.delete()
-                action = 'removed'
-                current_user_vote = None
-            else:
-                # Different vote - change it
-                vote.vote_type = vote_type
-                vote.save()
-                action = 'changed'
-                current_user_vote = vote_type
-        else:
-            action = 'added'
-            current_user_vote = vote_type
-    
-    # Return updated vote counts
+
+    try:
+        counts = await submit_vote(petition_id, user.id, VOTE_CHOICES[vote])
+    except PermissionDenied as exc:
+        # e.g. voting on one's own petition
+        return JsonResponse({
+            'status': 'error',
+            'message': str(exc)
+        })
     return JsonResponse({
         'status': 'success',
-        'action': action,
-        'upvotes': petition.get_upvotes(),
-        'downvotes': petition.get_downvotes(),
-        'net_votes': petition.get_vote_count(),
-        'user_vote': current_user_vote
-    })
\ No newline at end of file
+        'vote': vote,
+        'upvotes': counts['upvotes'],
+        'downvotes': counts['downvotes'],
+        'net_votes': counts['upvotes'] - counts['downvotes'],
+    })
+
+
+async def petition_stream(request, petition_id):
+    """Send the petition's vote counts as a server-sent event.
+
+    Under ASGI, ``movies.streams.StreamApplication`` answers this URL with
+    a live stream before the request gets here. Served any other way, an
+    endless response would hold a thread for good, so this sends the
+    current counts and the browser asks again after the retry delay.
+    """
+    counts = await sync_to_async(petition_counts)(petition_id)
+    if counts is None:
+        raise Http404('No such petition.')
+    return HttpResponse(
+        f'retry: {int(settings.PETITION_STREAM_POLL_SECONDS * 1000)}\n' + format_event(counts),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache'},
+    )
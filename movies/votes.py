@@ -0,0 +1,171 @@
+"""Petition votes, written in batches.
+
+SQLite takes one writer at a time, and each transaction pays for its lock
+and its commit whatever it contains. So the async ``petition_vote`` view
+does not write on its own: it hands the vote to the ``VoteBatcher`` of its
+event loop, which applies every vote that arrived meanwhile in a single
+transaction and answers each request with its petition's new counts,
+which also go out to the petition's live streams (see ``movies.streams``).
+Nothing waits on purpose: the first vote is written at once, and votes
+that come in during a write go into the next one.
+"""
+import asyncio
+import contextvars
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import PermissionDenied
+from django.db import close_old_connections
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404
+
+from moviesstore.cache import bump
+from moviesstore.db import atomic_with_retry
+from moviesstore.routers import record_write
+from .models import MoviePetition, PetitionVote
+from .streams import get_hub
+
+# keeps the OR of vote conditions well under SQLite's expression depth limit
+MAX_BATCH = 200
+
+
+def vote_tally(vote_type):
+    """Correlated subquery counting a petition's votes of one type."""
+    votes = (
+        PetitionVote.objects.filter(petition=OuterRef('pk'), vote_type=vote_type)
+        .order_by()
+        .values('petition')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(votes, output_field=IntegerField()), 0)
+
+
+@atomic_with_retry
+def apply_votes(votes):
+    """Apply ``(petition_id, voter_id, vote_type)`` votes in one transaction.
+
+    ``vote_type`` is True, False, or None to withdraw the vote; a later vote
+    of the same voter on the same petition wins. Returns one item per vote:
+    the petition's new ``{'upvotes', 'downvotes'}``, or the exception that
+    vote must raise.
+    """
+    petitioners = dict(
+        MoviePetition.objects.filter(id__in={vote[0] for vote in votes}, is_active=True)
+        .values_list('id', 'petitioner_id')
+    )
+    latest = {}
+    for petition_id, voter_id, vote_type in votes:
+        if petitioners.get(petition_id) not in (None, voter_id):
+            latest[petition_id, voter_id] = vote_type
+
+    withdrawn = Q()
+    cast = []
+    for (petition_id, voter_id), vote_type in latest.items():
+        if vote_type is None:
+            withdrawn |= Q(petition_id=petition_id, voter_id=voter_id)
+        else:
+            cast.append(PetitionVote(petition_id=petition_id, voter_id=voter_id, vote_type=vote_type))
+    if withdrawn:
+        PetitionVote.objects.filter(withdrawn).delete()
+    if cast:
+        PetitionVote.objects.bulk_create(
+            cast, update_conflicts=True, unique_fields=['petition', 'voter'], update_fields=['vote_type'],
+        )
+
+    counts = {}
+    touched = {petition_id for petition_id, voter_id in latest}
+    if touched:
+        petitions = MoviePetition.objects.filter(id__in=touched)
+        petitions.update(upvotes=vote_tally(True), downvotes=vote_tally(False))
+        counts = {
+            petition_id: {'upvotes': upvotes, 'downvotes': downvotes}
+            for petition_id, upvotes, downvotes in petitions.values_list('id', 'upvotes', 'downvotes')
+        }
+        # the upsert and update send no model signals
+        bump('petitions', *[f'petition:{petition_id}' for petition_id in touched])
+
+    results = []
+    for petition_id, voter_id, vote_type in votes:
+        if petition_id not in petitioners:
+            results.append(Http404('No such petition.'))
+        elif petitioners[petition_id] == voter_id:
+            results.append(PermissionDenied('You cannot vote on your own petition.'))
+        else:
+            results.append(counts[petition_id])
+    return results
+
+
+def _write_batch(votes):
+    # the flusher's thread serves no request, so nothing else recycles its connection
+    close_old_connections()
+    return apply_votes(votes)
+
+
+class VoteBatcher:
+    """Collects the votes submitted on one event loop and writes them together."""
+
+    def __init__(self, loop):
+        # weakly, as the registry's key: holding it would keep both forever
+        self.loop_ref = weakref.ref(loop)
+        self.pending = []
+        self.flusher = None
+
+    @property
+    def loop(self):
+        return self.loop_ref()
+
+    def submit(self, vote):
+        future = self.loop.create_future()
+        self.pending.append((vote, future))
+        if self.flusher is None:
+            # an empty context, so the writes are not attributed to
+            # whichever request happened to start the flusher
+            self.flusher = self.loop.create_task(self.flush(), context=contextvars.Context())
+        return future
+
+    async def flush(self):
+        try:
+            while self.pending:
+                batch, self.pending = self.pending[:MAX_BATCH], self.pending[MAX_BATCH:]
+                try:
+                    results = await sync_to_async(_write_batch)([vote for vote, future in batch])
+                except Exception as exc:
+                    results = [exc] * len(batch)
+                # a loop nobody streams from has no hub to publish to
+                hub = get_hub(self.loop, create=False)
+                for (vote, future), result in zip(batch, results):
+                    if hub is not None and not isinstance(result, Exception):
+                        hub.publish(vote[0], result)
+                    if future.done():
+                        # the request went away
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            self.flusher = None
+            # idle batchers are not kept: the registry would hold on to
+            # them and their loops, and under WSGI every vote has its own
+            if not self.pending and _batchers.get(self.loop) is self:
+                del _batchers[self.loop]
+
+
+_batchers = weakref.WeakKeyDictionary()
+
+
+async def submit_vote(petition_id, voter_id, vote_type):
+    """Queue a vote for the next batch and return the petition's new counts.
+
+    Raises Http404 for a missing or closed petition and PermissionDenied
+    for a vote on one's own petition.
+    """
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = VoteBatcher(loop)
+    counts = await batcher.submit((petition_id, voter_id, vote_type))
+    record_write()
+    return counts
@@ -2,6 +2,10 @@
 ASGI config for moviesstore project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server, e.g. ``uvicorn moviesstore.asgi:application``,
+so that async views such as ``movies.views.petition_vote`` run on the event
+loop instead of being wrapped for WSGI. Live petition streams are answered
+ahead of Django's handler (see ``movies.streams``).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -13,4 +17,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "moviesstore.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imports models, so only once Django is set up
+from movies.streams import StreamApplication  # noqa: E402
+
+application = StreamApplication(django_application)
@@ -0,0 +1,140 @@
+"""Helpers shared by the benchmark management commands."""
+import asyncio
+import contextlib
+import logging
+import math
+import os
+import shutil
+import tempfile
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+
+
+@contextlib.contextmanager
+def scratch_database(verbosity=0, on_disk=False):
+    """Run the block against a freshly migrated throwaway copy of the schema.
+
+    Benchmarks seed and mutate a lot of rows, so they never touch the
+    configured database; this reuses the test runner's database creation.
+    ``on_disk`` puts an SQLite database in a temporary file instead of
+    memory, so that multi-threaded benchmarks see real file locking.
+    """
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    directory = None
+    if on_disk and connection.vendor == 'sqlite':
+        directory = tempfile.mkdtemp(prefix='moviesstore-benchmark-')
+        test_settings['NAME'] = os.path.join(directory, 'db.sqlite3')
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        test_settings['NAME'] = old_test_name
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def quiet_loggers(*names):
+    """Silence the loggers ``names``, django.request by default, for the block.
+
+    Benchmarks count their failed requests instead of logging each one.
+    """
+    loggers = [logging.getLogger(name) for name in names or ['django.request']]
+    levels = [logger.level for logger in loggers]
+    for logger in loggers:
+        logger.setLevel(logging.CRITICAL)
+    try:
+        yield
+    finally:
+        for logger, level in zip(loggers, levels):
+            logger.setLevel(level)
+
+
+def unthrottled():
+    """Settings keeping every rate limit bucket, but with budgets no benchmark runs out of.
+
+    The limiter's cost stays in the measurements while it refuses nothing.
+    """
+    return override_settings(RATE_LIMITS={
+        scope: {kind: (10**9, 1) for kind in budgets}
+        for scope, budgets in settings.RATE_LIMITS.items()
+    })
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(samples)) - 1, 0)
+    return samples[rank]
+
+
+def summarize(samples):
+    """Latency summary, in milliseconds, of a list of durations in seconds."""
+    ordered = sorted(sample * 1000 for sample in samples)
+    return {
+        'count': len(ordered),
+        'mean': sum(ordered) / len(ordered) if ordered else 0.0,
+        'p50': percentile(ordered, 50),
+        'p95': percentile(ordered, 95),
+        'p99': percentile(ordered, 99),
+        'max': ordered[-1] if ordered else 0.0,
+    }
+
+
+def format_summary(label, summary):
+    return (
+        f"{label}: n={summary['count']} mean={summary['mean']:.2f}ms "
+        f"p50={summary['p50']:.2f}ms p95={summary['p95']:.2f}ms "
+        f"p99={summary['p99']:.2f}ms max={summary['max']:.2f}ms"
+    )
+
+
+def timed(func, *args, **kwargs):
+    """Call ``func`` and return ``(elapsed_seconds, result)``."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+class HTTPConnection:
+    """A minimal keep-alive HTTP/1.1 client connection, enough to POST votes."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def post(self, path, data, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = urlencode(data).encode()
+        head = [
+            f'POST {path} HTTP/1.1',
+            f'Host: {self.host}:{self.port}',
+            'Content-Type: application/x-www-form-urlencoded',
+            f'Content-Length: {len(body)}',
+            *(f'{name}: {value}' for name, value in headers.items()),
+        ]
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while (line := await self.reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+        return status, await self.reader.readexactly(length)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
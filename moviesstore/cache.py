@@ -0,0 +1,100 @@
+"""Versioned caching for the read-heavy pages.
+
+Cached entries are keyed by the current version of every scope they depend
+on (``'catalog'``, ``'movie:3'``, ``'petition:7'``...). Writes never delete
+entries; they bump the version of the affected scopes, so the next request
+looks under a new key and the stale entries simply age out. The receivers
+in ``movies.signals`` do the bumping when the underlying rows change.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(scope):
+    return f'version:{scope}'
+
+
+def versions(*scopes):
+    """Return the current version of each scope, initialising missing ones."""
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # seed with the clock rather than 1 so a version that was
+            # evicted can never come back and revive stale entries
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def version_tag(*scopes):
+    """A single string identifying the current state of ``scopes``."""
+    return '.'.join(str(value) for value in versions(*scopes))
+
+
+def bump(*scopes):
+    """Invalidate everything cached under ``scopes`` once the transaction commits."""
+    def bump_now():
+        for scope in scopes:
+            try:
+                cache.incr(_version_key(scope))
+            except ValueError:
+                # never read, so nothing can be cached under it yet
+                pass
+    transaction.on_commit(bump_now)
+
+
+def _is_cacheable_request(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        # pending flash messages are rendered into the page
+        and CookieStorage.cookie_name not in request.COOKIES
+    )
+
+
+def _is_cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # a page embedding a CSRF token is tied to this visitor's cookie
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and not request.session.modified
+    )
+
+
+def cache_anonymous(*scopes, timeout=None):
+    """Serve a view's responses to anonymous visitors from the cache.
+
+    ``scopes`` name the versions the page depends on and may reference
+    the view's URL keyword arguments, e.g. ``'petition:{petition_id}'``.
+    Logged-in users, who see per-user content, always get a fresh page.
+    """
+    if timeout is None:
+        timeout = settings.PAGE_CACHE_TIMEOUT
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _is_cacheable_request(request):
+                return view(request, *args, **kwargs)
+
+            tag = version_tag(*[scope.format(**kwargs) for scope in scopes])
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f'page:{view.__module__}.{view.__name__}:{tag}:{path}'
+
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if _is_cacheable_response(request, response):
+                    cache.set(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,70 @@
+"""SQLite tuned for concurrent workers.
+
+Use ``"ENGINE": "moviesstore.db"`` in ``DATABASES``. The backend in
+``base.py`` is Django's sqlite3 backend with two changes:
+
+* every new connection gets the pragmas in ``settings.SQLITE_PRAGMAS``
+  (WAL journal, ``synchronous=NORMAL``, a busy timeout, mmap and page cache
+  sizes); with ``CONN_MAX_AGE`` a worker pays for that once per connection
+  rather than once per request;
+* ``transaction.atomic`` opens ``BEGIN IMMEDIATE`` transactions
+  (``settings.SQLITE_TRANSACTION_MODE``). A deferred transaction that reads
+  before it writes cannot wait for the write lock: SQLite fails it at once
+  with "database is locked" whenever another writer got in between, busy
+  timeout or not. Taking the lock up front makes writers queue instead.
+
+Writers still give up once the busy timeout runs out, so write views also
+go through ``atomic_with_retry``, which reruns the whole transaction.
+
+WAL mode sticks to the database file. A database still in rollback journal
+mode is converted, its header rewritten, the first time it is opened here;
+writes go to ``db.sqlite3-wal`` until SQLite checkpoints them.
+"""
+import logging
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+LOCK_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_lock_error(exc):
+    return isinstance(exc, OperationalError) and str(exc).startswith(LOCK_MESSAGES)
+
+
+def atomic_with_retry(func=None, *, using=None, attempts=None, delay=0.02):
+    """Like ``transaction.atomic`` but retries the whole block on lock errors.
+
+    Up to ``attempts`` tries (``settings.DATABASE_WRITE_ATTEMPTS`` by
+    default) with jittered exponential backoff starting at ``delay``
+    seconds. The function must be safe to run again from the top. Inside an
+    outer transaction there is nothing to retry, so it just runs atomically.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            alias = using or DEFAULT_DB_ALIAS
+            tries = attempts or settings.DATABASE_WRITE_ATTEMPTS
+            if connections[alias].in_atomic_block:
+                with transaction.atomic(using=alias):
+                    return func(*args, **kwargs)
+
+            for attempt in range(1, tries + 1):
+                try:
+                    with transaction.atomic(using=alias):
+                        return func(*args, **kwargs)
+                except OperationalError as exc:
+                    if attempt == tries or not is_lock_error(exc):
+                        raise
+                    logger.debug('%s: %s, retrying (%d/%d)', func.__qualname__, exc, attempt, tries)
+                    time.sleep(delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
@@ -0,0 +1,273 @@
+"""Per-request query, template and latency metrics.
+
+``MetricsMiddleware`` gives each request a ``RequestMetrics`` in a context
+variable. Every database connection runs its statements through
+``record_query``, which charges them to the current request from whichever
+thread they run in, and the ``DjangoTemplates`` backend below times the
+templates a view renders.
+
+Each response reports its figures in a ``Server-Timing`` header, which
+browser dev tools show with the request. They are also added up per view,
+into histograms that ``metrics_view`` serves to staff as JSON. The
+histograms live in memory, so every worker process keeps its own.
+
+One statement run many times in a request, with different parameters, is
+usually a loop making one query per row (N+1); requests repeating a
+statement ``METRICS_DUPLICATE_WARNING`` times or more are logged.
+"""
+import bisect
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger(__name__)
+
+# histogram buckets: durations in ms, 25% apart from 0.05ms to about two
+# minutes, so a percentile is off by a quarter at most; and counts
+TIME_BOUNDS = [0.05 * 1.25 ** i for i in range(67)]
+COUNT_BOUNDS = sorted({0, *(round(1.25 ** i) for i in range(40))})
+
+_current = contextvars.ContextVar('moviesstore_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """What one request spent, and on what."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+        self.rendering = 0
+
+    @property
+    def duplicates(self):
+        """Statements run again after their first time."""
+        return sum(count - 1 for count in self.statements.values())
+
+    def server_timing(self, total):
+        return (
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries, '
+            f'{self.duplicates} duplicates", '
+            f'tpl;dur={self.template_time * 1000:.1f};desc="templates", '
+            f'total;dur={total * 1000:.1f}'
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_time += time.perf_counter() - start
+        metrics.queries += 1
+        metrics.statements[sql] += 1
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def record_queries_on_connect(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+class Template:
+    """A backend template whose renders count as template time."""
+
+    def __init__(self, template):
+        self.wrapped = template
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self.wrapped.render(context, request)
+        start = time.perf_counter()
+        metrics.rendering += 1
+        try:
+            return self.wrapped.render(context, request)
+        finally:
+            metrics.rendering -= 1
+            # a template rendered while rendering another is already timed
+            if not metrics.rendering:
+                metrics.template_time += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Django's template backend, timing every render for the metrics."""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name))
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0
+
+    def add(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the nearest-rank percentile."""
+        rank = max(math.ceil(pct / 100 * self.count), 1)
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                break
+        if index == len(self.bounds):
+            return self.max
+        return min(self.bounds[index], self.max)
+
+    def summary(self):
+        if not self.count:
+            return {}
+        return {
+            'mean': round(self.total / self.count, 2),
+            **{f'p{pct}': round(self.percentile(pct), 2) for pct in (50, 90, 95, 99)},
+            'max': round(self.max, 2),
+        }
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = Histogram(TIME_BOUNDS)
+        self.db_ms = Histogram(TIME_BOUNDS)
+        self.template_ms = Histogram(TIME_BOUNDS)
+        self.queries = Histogram(COUNT_BOUNDS)
+        self.duplicates = Histogram(COUNT_BOUNDS)
+
+    def add(self, metrics, total, status):
+        self.requests += 1
+        if status >= 500:
+            self.errors += 1
+        self.total_ms.add(total * 1000)
+        self.db_ms.add(metrics.sql_time * 1000)
+        self.template_ms.add(metrics.template_time * 1000)
+        self.queries.add(metrics.queries)
+        self.duplicates.add(metrics.duplicates)
+
+    def summary(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'total_ms': self.total_ms.summary(),
+            'db_ms': self.db_ms.summary(),
+            'template_ms': self.template_ms.summary(),
+            'queries': self.queries.summary(),
+            'duplicates': self.duplicates.summary(),
+        }
+
+
+class Registry:
+    """The per-view statistics of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.started = time.time()
+
+    def add(self, view, metrics, total, status):
+        with self.lock:
+            if view not in self.views:
+                self.views[view] = ViewStats()
+            self.views[view].add(metrics, total, status)
+
+    def snapshot(self):
+        with self.lock:
+            # the views taking the most time overall first
+            ranked = sorted(self.views.items(), key=lambda item: item[1].total_ms.total, reverse=True)
+            return {
+                'pid': os.getpid(),
+                'uptime_s': round(time.time() - self.started),
+                'views': {view: stats.summary() for view, stats in ranked},
+            }
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        response['Server-Timing'] = metrics.server_timing(total)
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.add(view, metrics, total, response.status_code)
+
+        sql, count = max(metrics.statements.items(), key=lambda item: item[1], default=('', 0))
+        if count >= settings.METRICS_DUPLICATE_WARNING:
+            logger.warning('%s ran one statement %d times, likely an N+1 query: %s', view, count, sql)
+        return response
+
+
+@staff_member_required
+def metrics_view(request):
+    """This process's per-view metrics, as JSON."""
+    return JsonResponse(registry.snapshot())
@@ -0,0 +1,124 @@
+"""Token-bucket rate limits for the endpoints that write on every request.
+
+A bucket holds up to ``requests`` tokens and gets one back every
+``seconds / requests``; each request takes a token and is refused with a
+429 when there is none left. The cache keeps a bucket as the time it will
+be full again, in milliseconds (the "theoretical arrival time" of GCRA), so
+taking a token is a single ``cache.incr`` by the refill interval: atomic
+with the local memory, memcached and Redis backends, and no read-modify-
+write race between concurrent requests. The entry expires when the bucket
+fills up again, so idle clients cost nothing and their next request starts
+a new full bucket with ``cache.add``.
+
+RATE_LIMITS gives each scope a budget per logged-in user and a larger one
+per client IP address, REMOTE_ADDR, for visitors sharing an address.
+
+Async views take their tokens on the event loop from the local memory
+cache, and from a thread with any other backend, which would block it.
+"""
+import math
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse, JsonResponse
+
+
+def take(key, requests, seconds):
+    """Take a token from bucket ``key``; return 0, or the seconds until one is free."""
+    interval = math.ceil(seconds * 1000 / requests)
+    now = int(time.time() * 1000)
+    if cache.add(key, now + interval, interval / 1000):
+        return 0
+    try:
+        full_at = cache.incr(key, interval)
+    except ValueError:
+        # expired between add and incr: the bucket is full again
+        return take(key, requests, seconds)
+    wait = full_at - now - requests * interval
+    if wait > 0:
+        cache.decr(key, interval)
+        return wait / 1000
+    cache.touch(key, (full_at - now) / 1000)
+    return 0
+
+
+def refund(key, requests, seconds):
+    """Put back a token taken from bucket ``key``."""
+    try:
+        cache.decr(key, math.ceil(seconds * 1000 / requests))
+    except ValueError:
+        pass
+
+
+def check(scope, request, user):
+    """Take a token from each of the request's ``scope`` buckets.
+
+    Returns 0 if the request may go ahead, otherwise the seconds until it
+    could; a refused request takes nothing.
+    """
+    budgets = settings.RATE_LIMITS.get(scope)
+    if not budgets:
+        return 0
+    buckets = []
+    if user.is_authenticated and 'user' in budgets:
+        buckets.append((f'ratelimit:{scope}:user:{user.pk}', *budgets['user']))
+    if 'ip' in budgets:
+        buckets.append((f'ratelimit:{scope}:ip:{request.META.get("REMOTE_ADDR")}', *budgets['ip']))
+
+    for taken, bucket in enumerate(buckets):
+        wait = take(*bucket)
+        if wait:
+            for key, requests, seconds in buckets[:taken]:
+                refund(key, requests, seconds)
+            return wait
+    return 0
+
+
+def in_memory():
+    """Whether the cache lives in this process, so that no call to it waits."""
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def too_many_requests(request, wait):
+    message = 'Too many requests. Please wait a moment and try again.'
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        response = JsonResponse({'status': 'error', 'message': message}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = math.ceil(wait)
+    return response
+
+
+def rate_limit(scope):
+    """Refuse a view's requests beyond the RATE_LIMITS budgets of ``scope``.
+
+    Works on sync and async views. Put it under ``login_required`` and
+    ``require_POST`` so that only requests the view would serve count.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                user = await request.auser()
+                if in_memory():
+                    # a locmem cache call is cheaper than a hop to a thread
+                    wait = check(scope, request, user)
+                else:
+                    # file and network caches would block the event loop
+                    wait = await sync_to_async(check, thread_sensitive=False)(scope, request, user)
+                if wait:
+                    return too_many_requests(request, wait)
+                return await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                wait = check(scope, request, request.user)
+                if wait:
+                    return too_many_requests(request, wait)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,118 @@
+"""Send catalog reads to read replicas, everything else to the primary.
+
+Models of the apps in ``settings.REPLICA_READ_APPS`` are read from one of
+the aliases in ``settings.DATABASE_REPLICAS``, chosen once per request;
+writes, and reads of every other model, use ``default``.
+
+A replica may lag behind, so a visitor must read their own writes from the
+primary. Within a request, reads stick to the primary once anything has
+been written, and from the start of any non-GET request (its reads usually
+feed a write). ``PrimaryPinMiddleware`` then sets a short-lived cookie so
+the requests that follow a write, typically the redirect after a POST,
+stay on the primary until the replicas have caught up. Code running
+outside a request can call ``pin_primary()``.
+"""
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'pin_primary'
+
+# per request: {'pinned': bool, 'wrote': bool, 'replica': alias or None}
+_state = contextvars.ContextVar('moviesstore_db_state', default=None)
+
+
+def _current_state():
+    state = _state.get()
+    if state is None:
+        state = {'pinned': False, 'wrote': False, 'replica': None}
+        _state.set(state)
+    return state
+
+
+def pin_primary():
+    """Read everything from the primary for the rest of the request or task."""
+    _current_state()['pinned'] = True
+
+
+def record_write():
+    """Note that the current request wrote, as if through ``db_for_write``.
+
+    For writes made on the request's behalf in another context.
+    """
+    state = _current_state()
+    state['pinned'] = state['wrote'] = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or model._meta.app_label not in settings.REPLICA_READ_APPS:
+            return None
+        state = _current_state()
+        if state['pinned']:
+            return DEFAULT_DB_ALIAS
+        if state['replica'] is None:
+            state['replica'] = random.choice(replicas)
+        return state['replica']
+
+    def db_for_write(self, model, **hints):
+        record_write()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary, like their rows
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class PrimaryPinMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.start(request)
+        try:
+            return self.finish(self.get_response(request))
+        finally:
+            _state.reset(token)
+
+    async def __acall__(self, request):
+        token = self.start(request)
+        try:
+            return self.finish(await self.get_response(request))
+        finally:
+            _state.reset(token)
+
+    def start(self, request):
+        return _state.set({
+            'pinned': request.method not in ('GET', 'HEAD') or PIN_COOKIE in request.COOKIES,
+            'wrote': False,
+            'replica': None,
+        })
+
+    def finish(self, response):
+        if _state.get()['wrote'] and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
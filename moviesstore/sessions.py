@@ -0,0 +1,73 @@
+"""Session engine: signed cookies for anonymous visitors, cached_db after login.
+
+Anonymous browsing only keeps a cart id and the odd flash message in the
+session, so that state travels in a signed cookie and never costs a write
+to ``django_session``. Once a user logs in the session moves to the
+database (read through the cache) where it can be revoked server-side, and
+a save that would write back exactly what was loaded is skipped.
+"""
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.core import signing
+
+COOKIE_SALT = 'moviesstore.sessions'
+
+
+def is_cookie_key(session_key):
+    # signed values always contain the ':' separator, which never appears
+    # in the random keys of database sessions
+    return bool(session_key) and ':' in session_key
+
+
+class SessionStore(CachedDBStore):
+    def load(self):
+        if is_cookie_key(self.session_key):
+            try:
+                data = signing.loads(
+                    self.session_key,
+                    serializer=self.serializer,
+                    max_age=self.get_session_cookie_age(),
+                    salt=COOKIE_SALT,
+                )
+            except Exception:
+                # bad signature or expired: start an empty session
+                self._session_key = None
+                data = {}
+        else:
+            data = super().load()
+        self._loaded_state = self.fingerprint(data)
+        return data
+
+    def fingerprint(self, data):
+        return self.serializer().dumps(data)
+
+    def exists(self, session_key):
+        if is_cookie_key(session_key):
+            return False
+        return super().exists(session_key)
+
+    def save(self, must_create=False):
+        if SESSION_KEY not in self._session:
+            # anonymous: the signed data is the key, sent back as the cookie
+            self._session_key = signing.dumps(
+                self._session, compress=True, salt=COOKIE_SALT, serializer=self.serializer
+            )
+            return
+
+        if is_cookie_key(self.session_key):
+            # just logged in: move the data into a new database session
+            self._session_key = None
+        elif (
+            not must_create
+            and self.session_key
+            and self.fingerprint(self._session) == getattr(self, '_loaded_state', None)
+        ):
+            return
+        super().save(must_create)
+        self._loaded_state = self.fingerprint(self._session)
+
+    def delete(self, session_key=None):
+        if is_cookie_key(self.session_key if session_key is None else session_key):
+            # nothing is stored server-side
+            return
+        super().delete(session_key)
@@ -41,10 +41,14 @@ INSTALLED_APPS = [
     "movies",
     "accounts",
     "cart",
+    "tasks",
 ]
 
 MIDDLEWARE = [
+    # first, so that its latency covers the other middleware
+    "moviesstore.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "moviesstore.routers.PrimaryPinMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -57,7 +61,8 @@ ROOT_URLCONF = "moviesstore.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # Django's backend, timing renders for moviesstore.metrics
+        "BACKEND": "moviesstore.metrics.DjangoTemplates",
         "DIRS": [os.path.join(BASE_DIR,
                               'moviesstore/templates')],
         "APP_DIRS": True,
@@ -77,14 +82,157 @@ WSGI_APPLICATION = "moviesstore.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
+# moviesstore.db is the sqlite3 backend tuned for concurrent workers: it
+# applies SQLITE_PRAGMAS to each new connection and starts transactions in
+# SQLITE_TRANSACTION_MODE. Connections are kept open between requests.
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        "ENGINE": "moviesstore.db",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": int(os.environ.get("MOVIESSTORE_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+SQLITE_PRAGMAS = {
+    # readers no longer block the writer, nor it them. The mode is stored in
+    # the database file: the committed db.sqlite3 is in WAL mode already, so
+    # opening it does not modify it, and git ignores its -wal and -shm files
+    "journal_mode": "wal",
+    # in WAL mode this only risks the last commits on power loss, not corruption
+    "synchronous": "normal",
+    # milliseconds to wait for the write lock before "database is locked"
+    "busy_timeout": 5000,
+    "mmap_size": 128 * 1024 * 1024,
+    # negative means KiB: a 32 MB page cache per connection
+    "cache_size": -32000,
+}
+
+# Read replicas (see moviesstore.routers): MOVIESSTORE_REPLICAS lists SQLite
+# files, separated like PATH, that the sync_replicas command keeps as copies
+# of the primary. With a server database, point these aliases at its replicas.
+
+DATABASE_REPLICAS = []
+for number, name in enumerate(filter(None, os.environ.get("MOVIESSTORE_REPLICAS", "").split(os.pathsep)), 1):
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "NAME": name,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{number}")
+
+DATABASE_ROUTERS = ["moviesstore.routers.ReplicaRouter"]
+
+# Apps whose reads may be served by a replica: the catalog and its reviews
+REPLICA_READ_APPS = ["movies"]
+
+# Seconds a visitor keeps reading from the primary after writing something
+REPLICA_PIN_SECONDS = 10
+
+# IMMEDIATE takes the write lock at BEGIN, so concurrent writers wait out the
+# busy timeout instead of failing when a read-then-write transaction upgrades
+SQLITE_TRANSACTION_MODE = "IMMEDIATE"
+
+# Tries of a write transaction that fails on a lock (see moviesstore.db)
+DATABASE_WRITE_ATTEMPTS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Local memory is per process: with several workers use the file backend
+# so a write invalidates the cached pages of every worker.
+
+CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "moviesstore",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache",
+    },
+}
+
+CACHES = {
+    "default": CACHE_BACKENDS[os.environ.get("MOVIESSTORE_CACHE", "locmem")],
+}
+
+# Seconds a rendered page or fragment is kept when nothing invalidates it
+PAGE_CACHE_TIMEOUT = 300
+
+# Request metrics (see moviesstore.metrics): a request running one statement
+# this many times is logged as a likely N+1 query
+METRICS_DUPLICATE_WARNING = 5
+
+# Live petition counts (see movies.streams): how often a watched petition's
+# version is checked for votes cast elsewhere, and the longest an idle stream
+# goes without sending anything
+PETITION_STREAM_POLL_SECONDS = 2
+PETITION_STREAM_KEEPALIVE = 15
+
+# "Customers also bought" (see movies.recommendations): how many similar
+# movies to keep per movie, and how many orders must hold a pair of movies
+# before one is recommended with the other
+RECOMMENDATIONS_PER_MOVIE = 6
+RECOMMENDATION_MIN_ORDERS = 2
+
+# Home page rankings (see movies.rollups): best sellers by units sold over
+# the last BEST_SELLERS_DAYS, trending by reviews over the last TRENDING_DAYS
+BEST_SELLERS_DAYS = 30
+TRENDING_DAYS = 7
+HOME_RANKING_SIZE = 4
+
+# Petition title matching (see movies.titles): the share of the trigrams of
+# the shorter of a typed title and a petition or movie the other must contain
+# for it to be suggested, and how many of each are suggested
+TITLE_MATCH_THRESHOLD = 0.6
+TITLE_SUGGESTIONS = 5
+
+# Background tasks (see tasks.queue): tries of a failing task, seconds
+# before its first retry (doubled for each next one), seconds a worker holds
+# a task before it is presumed dead, how often idle workers look for tasks,
+# and days done tasks are kept. MOVIESSTORE_TASKS_EAGER=1 runs each task in
+# the process that queued it, once its transaction commits.
+TASKS_EAGER = os.environ.get("MOVIESSTORE_TASKS_EAGER", "") == "1"
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 30
+TASK_LEASE_SECONDS = 300
+TASK_POLL_SECONDS = 1
+TASK_KEEP_DAYS = 7
+
+# Rate limits (see moviesstore.ratelimit): for each scope, the tokens a
+# bucket holds and the seconds it takes to refill, for each logged-in user
+# and each IP address. MOVIESSTORE_RATE_LIMITS=off lifts them, e.g. for a
+# server under the load test commands.
+RATE_LIMITS = {
+    "vote": {"user": (60, 60), "ip": (600, 60)},
+    "review": {"user": (5, 300), "ip": (50, 300)},
+    "report": {"user": (10, 3600), "ip": (50, 3600)},
+    # title suggestions while a petition is typed, at most every 250ms
+    "suggest": {"user": (120, 60), "ip": (600, 60)},
+}
+if os.environ.get("MOVIESSTORE_RATE_LIMITS", "") == "off":
+    RATE_LIMITS = {}
+
+
+# Email
+# https://docs.djangoproject.com/en/5.0/topics/email/
+# Order confirmations and moderation notices are printed to the console of
+# the worker sending them unless MOVIESSTORE_EMAIL_BACKEND names a backend.
+
+EMAIL_BACKEND = os.environ.get("MOVIESSTORE_EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+DEFAULT_FROM_EMAIL = "MoviesStore <noreply@moviesstore.local>"
+
+
+# Sessions
+# https://docs.djangoproject.com/en/5.0/topics/http/sessions/
+# Anonymous visitors get signed-cookie sessions and logged-in users cached_db
+# ones (see moviesstore.sessions). MOVIESSTORE_SESSION_ENGINE selects any
+# other engine, e.g. django.contrib.sessions.backends.db.
+
+SESSION_ENGINE = os.environ.get("MOVIESSTORE_SESSION_ENGINE", "moviesstore.sessions")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -132,4 +280,11 @@ STATICFILES_DIRS = [
 ]
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-MEDIA_URL = '/media/'
\ No newline at end of file
+MEDIA_URL = '/media/'
+
+# Widths, in pixels, of the resized poster derivatives (see movies.images)
+MOVIE_THUMBNAIL_WIDTHS = [160, 320, 640]
+
+# Seconds the widths generated for a poster are remembered, as an upper bound
+# when the process writing them has its own cache
+MOVIE_THUMBNAIL_CACHE_TIMEOUT = 3600
\ No newline at end of file
@@ -0,0 +1,146 @@
+// Optimistic, debounced petition voting.
+//
+// A voting widget is any element with data-petition-votes="<vote url>",
+// data-vote="up", "down" or "" (the user's current vote) and
+// data-csrf-token. Inside it, [data-vote-count="up|down|net"] elements show
+// the counts and [data-vote-button="up|down"] buttons cast votes.
+//
+// A click updates the page immediately. The request goes out only once
+// clicking has paused for DEBOUNCE_MS and carries the final choice, so a
+// burst of toggles costs at most one write, and none if the user ends up
+// back where they started. The server's counts replace the guessed ones
+// when it answers; on failure the widget reverts to the last saved state.
+//
+// With data-petition-stream="<stream url>" the widget also listens to the
+// petition's server-sent events and shows everyone else's votes as they come.
+(function () {
+    const DEBOUNCE_MS = 400;
+
+    function withVote(state, vote) {
+        const result = {vote: vote, upvotes: state.upvotes, downvotes: state.downvotes};
+        if (state.vote === 'up') result.upvotes--;
+        if (state.vote === 'down') result.downvotes--;
+        if (vote === 'up') result.upvotes++;
+        if (vote === 'down') result.downvotes++;
+        return result;
+    }
+
+    function showMessage(message, type) {
+        const alertDiv = document.createElement('div');
+        alertDiv.className = `alert alert-${type} alert-dismissible fade show`;
+        alertDiv.textContent = message;
+        const close = document.createElement('button');
+        close.type = 'button';
+        close.className = 'btn-close';
+        close.dataset.bsDismiss = 'alert';
+        alertDiv.appendChild(close);
+
+        const container = document.querySelector('.container');
+        container.insertBefore(alertDiv, container.firstChild);
+        setTimeout(() => alertDiv.remove(), 3000);
+    }
+
+    function setUp(widget) {
+        const counts = {};
+        widget.querySelectorAll('[data-vote-count]').forEach(el => {
+            counts[el.dataset.voteCount] = el;
+        });
+        const buttons = widget.querySelectorAll('[data-vote-button]');
+        const count = name => (counts[name] ? parseInt(counts[name].textContent, 10) || 0 : 0);
+
+        // what the server last confirmed, and what the page shows
+        let saved = {vote: widget.dataset.vote, upvotes: count('up'), downvotes: count('down')};
+        let shown = saved;
+        let timer = null;
+        let sending = false;
+
+        function render() {
+            if (counts.up) counts.up.textContent = shown.upvotes;
+            if (counts.down) counts.down.textContent = shown.downvotes;
+            if (counts.net) counts.net.textContent = shown.upvotes - shown.downvotes;
+            buttons.forEach(button => {
+                const active = button.dataset.voteButton === shown.vote;
+                button.classList.toggle('active', active);
+                button.setAttribute('aria-pressed', active);
+            });
+        }
+
+        function schedule() {
+            clearTimeout(timer);
+            timer = setTimeout(send, DEBOUNCE_MS);
+        }
+
+        function send() {
+            if (sending) {
+                // one request at a time; the latest choice goes next
+                schedule();
+                return;
+            }
+            if (shown.vote === saved.vote) return;
+
+            sending = true;
+            const body = new FormData();
+            body.append('vote', shown.vote || 'none');
+            fetch(widget.dataset.petitionVotes, {
+                method: 'POST',
+                body: body,
+                headers: {
+                    'X-CSRFToken': widget.dataset.csrfToken,
+                    'X-Requested-With': 'XMLHttpRequest'
+                }
+            })
+            // an HTML error page (expired login, CSRF) becomes a plain failure
+            .then(response => response.json().catch(() => ({status: 'error'})))
+            .then(data => {
+                if (data.status !== 'success') {
+                    throw new Error(data.message);
+                }
+                saved = {
+                    vote: data.vote === 'none' ? '' : data.vote,
+                    upvotes: data.upvotes,
+                    downvotes: data.downvotes
+                };
+                // keep any choice made while the request was out
+                shown = withVote(saved, shown.vote);
+                render();
+            })
+            .catch(error => {
+                shown = saved;
+                render();
+                showMessage(error.message || 'Your vote could not be saved.', 'danger');
+            })
+            .finally(() => {
+                sending = false;
+            });
+        }
+
+        if (widget.dataset.petitionStream && window.EventSource) {
+            const stream = new EventSource(widget.dataset.petitionStream);
+            stream.onmessage = event => {
+                const data = JSON.parse(event.data);
+                // the counts may already hold a vote still in flight; its
+                // response arrives right behind them and settles the numbers
+                saved = {vote: saved.vote, upvotes: data.upvotes, downvotes: data.downvotes};
+                shown = withVote(saved, shown.vote);
+                render();
+            };
+            // the petition was closed or removed
+            stream.addEventListener('closed', () => stream.close());
+        }
+
+        buttons.forEach(button => {
+            button.addEventListener('click', () => {
+                const vote = button.dataset.voteButton;
+                // clicking the current vote again removes it
+                shown = withVote(shown, shown.vote === vote ? '' : vote);
+                render();
+                schedule();
+            });
+        });
+        render();
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('[data-petition-votes]').forEach(setUp);
+    });
+})();
@@ -0,0 +1,184 @@
+import asyncio
+import contextvars
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.models import Session
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from cart.models import CartLine
+from movies.models import Movie
+from . import ratelimit
+from .routers import PIN_COOKIE, PrimaryPinMiddleware, ReplicaRouter, pin_primary
+from .sessions import SessionStore
+
+
+class RateLimitTests(TestCase):
+    def check_thread(self):
+        """(event loop thread, thread the limiter checked on) for an async view."""
+        threads = {}
+
+        async def view(request):
+            threads['loop'] = threading.get_ident()
+            return HttpResponse()
+
+        def check(scope, request, user):
+            threads['check'] = threading.get_ident()
+            return 0
+
+        async def auser():
+            return AnonymousUser()
+
+        request = RequestFactory().post('/')
+        request.auser = auser
+        with mock.patch.object(ratelimit, 'check', check):
+            asyncio.run(ratelimit.rate_limit('vote')(view)(request))
+        return threads['loop'], threads['check']
+
+    def test_locmem_checks_on_the_event_loop(self):
+        loop, check = self.check_thread()
+        self.assertEqual(check, loop)
+
+    def test_other_caches_check_off_the_event_loop(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }}):
+                loop, check = self.check_thread()
+        self.assertNotEqual(check, loop)
+
+
+@override_settings(SESSION_ENGINE='moviesstore.sessions')
+class HybridSessionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='buyer-password')
+        self.movie = Movie.objects.create(name='Heat', price=5, description='A heist.')
+
+    def session_key(self):
+        return self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def log_in(self):
+        self.client.post('/accounts/login/', {'username': 'buyer', 'password': 'buyer-password'})
+
+    def test_anonymous_session_is_a_signed_cookie(self):
+        self.client.post(f'/cart/{self.movie.id}/add/', {'quantity': 2})
+        self.assertIn(':', self.session_key())
+        self.assertFalse(Session.objects.exists())
+
+    def test_login_moves_the_session_and_cart_to_the_database(self):
+        self.client.post(f'/cart/{self.movie.id}/add/', {'quantity': 2})
+        self.log_in()
+        key = self.session_key()
+        self.assertNotIn(':', key)
+        self.assertTrue(Session.objects.filter(session_key=key).exists())
+        self.assertEqual(CartLine.objects.get(cart__user=self.user, movie=self.movie).quantity, 2)
+
+    def test_tampered_cookie_is_an_empty_session(self):
+        store = SessionStore()
+        store['cart_id'] = 1
+        store.save()
+        tampered = SessionStore(store.session_key + 'x')
+        self.assertEqual(tampered.load(), {})
+        self.assertIsNone(tampered.session_key)
+
+    def test_expired_cookie_is_an_empty_session(self):
+        store = SessionStore()
+        store['cart_id'] = 1
+        store.save()
+        later = time.time() + settings.SESSION_COOKIE_AGE + 60
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            self.assertEqual(SessionStore(store.session_key).load(), {})
+
+    def test_cookie_keys_are_not_stored(self):
+        store = SessionStore()
+        store['cart_id'] = 1
+        store.save()
+        self.assertFalse(store.exists(store.session_key))
+        # nothing to delete server-side, and nothing fails
+        store.delete()
+        SessionStore().delete(store.session_key)
+        self.assertFalse(Session.objects.exists())
+
+    def test_logout_flushes_the_session(self):
+        self.log_in()
+        key = self.session_key()
+        self.client.get('/accounts/logout/')
+        self.assertFalse(Session.objects.filter(session_key=key).exists())
+        self.assertNotEqual(self.session_key(), key)
+        self.assertNotIn(SESSION_KEY, self.client.session)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_READ_APPS=['movies'])
+class ReplicaRouterTests(TestCase):
+    router = ReplicaRouter()
+
+    def read(self):
+        return self.router.db_for_read(Movie)
+
+    def write(self):
+        return self.router.db_for_write(Movie)
+
+    def in_context(self, func):
+        # each request or task runs in a context of its own
+        return contextvars.Context().run(func)
+
+    def test_reads_go_to_a_replica(self):
+        self.assertEqual(self.in_context(self.read), 'replica1')
+
+    def test_other_apps_read_from_the_primary(self):
+        self.assertIsNone(self.in_context(lambda: self.router.db_for_read(User)))
+
+    def test_reads_after_a_write_go_to_the_primary(self):
+        def request():
+            before = self.read()
+            self.write()
+            return before, self.read()
+
+        self.assertEqual(self.in_context(request), ('replica1', 'default'))
+
+    def test_pinned_reads_go_to_the_primary(self):
+        def task():
+            pin_primary()
+            return self.read()
+
+        self.assertEqual(self.in_context(task), 'default')
+
+    def respond(self, request, write=False):
+        reads = []
+
+        def view(request):
+            reads.append(self.read())
+            if write:
+                self.write()
+                reads.append(self.read())
+            return HttpResponse()
+
+        return PrimaryPinMiddleware(view)(request), reads
+
+    def test_write_pins_later_requests_with_a_cookie(self):
+        response, reads = self.respond(RequestFactory().get('/'), write=True)
+        self.assertEqual(reads, ['replica1', 'default'])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pin_cookie_reads_from_the_primary(self):
+        request = RequestFactory().get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        response, reads = self.respond(request)
+        self.assertEqual(reads, ['default'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_posts_read_from_the_primary(self):
+        response, reads = self.respond(RequestFactory().post('/'))
+        self.assertEqual(reads, ['default'])
+
+    def test_requests_do_not_share_state(self):
+        self.respond(RequestFactory().get('/'), write=True)
+        response, reads = self.respond(RequestFactory().get('/'))
+        self.assertEqual(reads, ['replica1'])
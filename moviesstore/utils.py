@@ -0,0 +1,12 @@
+"""Small helpers shared by the apps."""
+import itertools
+
+
+def batched(iterable, size):
+    """Lists of ``size`` items of ``iterable``, the last one possibly shorter.
+
+    itertools.batched from Python 3.12, which yields tuples.
+    """
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
@@ -0,0 +1,20 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'max_attempts', 'run_after', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key')
+    readonly_fields = ('attempts', 'locked_until', 'worker', 'last_error', 'created_at', 'finished_at')
+    actions = ['retry_tasks']
+
+    def retry_tasks(self, request, queryset):
+        queryset.filter(status=Task.FAILED).update(
+            status=Task.QUEUED, attempts=0, run_after=timezone.now(), finished_at=None,
+        )
+    retry_tasks.short_description = 'Retry selected failed tasks'
+
+
+admin.site.register(Task, TaskAdmin)
@@ -0,0 +1,26 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from tasks.queue import Worker
+
+
+class Command(BaseCommand):
+    help = ('Run queued background tasks. Any number of workers can run at once; '
+            'SIGTERM or Ctrl-C lets the running tasks finish, then exits.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4,
+                            help='Tasks to run at the same time, each on its own thread.')
+        parser.add_argument('--poll', type=float,
+                            help='Seconds between looks for new tasks when idle; TASK_POLL_SECONDS by default.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no task is due, rather than waiting for more.')
+
+    def handle(self, *args, **options):
+        worker = Worker(threads=options['threads'], poll=options['poll'])
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda signum, frame: worker.stop())
+        outcomes = worker.run(burst=options['burst'])
+        summary = ', '.join(f'{count} {outcome}' for outcome, count in sorted(outcomes.items()))
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker.name} stopped: {summary or "no tasks"}.'))
@@ -0,0 +1,197 @@
+"""A task queue kept in the database, for side effects too slow for a request.
+
+Functions decorated with ``@task`` in an app's ``tasks`` module are queued
+with ``enqueue``, which writes a ``Task`` row in the caller's transaction:
+the task exists if and only if the change it follows up on was committed.
+A ``key`` makes enqueueing idempotent, so a repeated save or a retried
+request queues its task once for as long as the row is kept.
+
+The run_tasks command runs a ``Worker``. Workers lease due tasks with a
+conditional UPDATE, so any number of them, threads or processes, share the
+queue without two running the same task; one that dies mid-task loses its
+lease after TASK_LEASE_SECONDS and the task goes to another. A task that
+raises is retried up to its ``max_attempts`` with exponential backoff from
+TASK_RETRY_DELAY, then left failed with its traceback, for the admin to
+retry. Tasks can therefore run more than once and must be safe to.
+
+With TASKS_EAGER, a task runs in the enqueueing process right after its
+transaction commits, so development and tests need no worker;
+``run_pending`` runs whatever is due, delayed tasks included once due.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# task name -> function, filled in by @task as the apps' tasks modules load
+registry = {}
+
+
+def task(func=None, *, max_attempts=None):
+    """Register ``func`` as a task; ``max_attempts`` defaults to TASK_MAX_ATTEMPTS."""
+    def decorator(func):
+        func.task_name = f'{func.__module__}.{func.__qualname__}'
+        func.max_attempts = max_attempts
+        registry[func.task_name] = func
+        return func
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def enqueue(func, args=(), kwargs=None, key=None, delay=None):
+    """Queue ``func(*args, **kwargs)`` to run once the current transaction commits.
+
+    Arguments must be JSON serializable. ``delay``, a timedelta, holds the
+    first run back. If a task with ``key`` exists it is returned instead.
+    """
+    fields = {
+        'name': func.task_name,
+        'args': list(args),
+        'kwargs': kwargs or {},
+        'max_attempts': func.max_attempts or settings.TASK_MAX_ATTEMPTS,
+        'run_after': timezone.now() + (delay or timedelta()),
+    }
+    if key is None:
+        task = Task.objects.create(**fields)
+    else:
+        task, created = Task.objects.get_or_create(key=key, defaults=fields)
+        if not created:
+            return task
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: run_task(task.id), using=router.db_for_write(Task))
+    return task
+
+
+def due(now):
+    """Tasks ready to run at ``now``: queued ones, and running ones whose lease ran out."""
+    return Q(status=Task.QUEUED, run_after__lte=now) | Q(status=Task.RUNNING, locked_until__lt=now)
+
+
+def claim(worker, limit, tasks=None):
+    """Lease up to ``limit`` due tasks, oldest first, to ``worker``."""
+    tasks = Task.objects.all() if tasks is None else tasks
+    candidates = tasks.filter(due(timezone.now())).order_by('run_after', 'id')
+    claimed = []
+    for task_id in candidates.values_list('id', flat=True)[:limit]:
+        now = timezone.now()
+        # compare and set: of workers racing for a task, only one UPDATE
+        # still finds it due
+        leased = Task.objects.filter(due(now), id=task_id).update(
+            status=Task.RUNNING,
+            worker=worker,
+            attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=settings.TASK_LEASE_SECONDS),
+        )
+        if leased:
+            claimed.append(task_id)
+    return list(Task.objects.filter(id__in=claimed).order_by('run_after', 'id'))
+
+
+def execute(task):
+    """Run a leased task and record the outcome, which it returns."""
+    func = registry.get(task.name)
+    try:
+        if func is None:
+            raise LookupError(f'No task named {task.name!r} is registered.')
+        func(*task.args, **task.kwargs)
+    except Exception:
+        now = timezone.now()
+        changes = {'last_error': traceback.format_exc(), 'locked_until': None}
+        if func is None or task.attempts >= task.max_attempts:
+            logger.exception('Task %s failed', task)
+            changes.update(status=Task.FAILED, finished_at=now)
+        else:
+            delay = settings.TASK_RETRY_DELAY * 2 ** (task.attempts - 1)
+            logger.warning('Task %s failed, retrying in %ss', task, delay, exc_info=True)
+            changes.update(status=Task.QUEUED, run_after=now + timedelta(seconds=delay))
+    else:
+        changes = {'status': Task.DONE, 'finished_at': timezone.now(), 'locked_until': None}
+    # the attempt count fences off a run whose lease ran out: the task has
+    # been claimed again since, and its new run records the outcome
+    Task.objects.filter(id=task.id, status=Task.RUNNING, attempts=task.attempts).update(**changes)
+    return changes['status']
+
+
+def run_task(task_id):
+    """Run task ``task_id`` here and now, if it is due."""
+    for task in claim(f'{socket.gethostname()}:{os.getpid()}', 1, Task.objects.filter(id=task_id)):
+        execute(task)
+
+
+def purge():
+    """Delete the tasks done more than TASK_KEEP_DAYS ago, freeing their keys."""
+    cutoff = timezone.now() - timedelta(days=settings.TASK_KEEP_DAYS)
+    deleted, _ = Task.objects.filter(status=Task.DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+class Worker:
+    """Runs due tasks on up to ``threads`` threads at a time."""
+
+    def __init__(self, threads=1, poll=None):
+        self.threads = threads
+        self.poll = settings.TASK_POLL_SECONDS if poll is None else poll
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+
+    def stop(self):
+        """Stop claiming tasks; ``run`` returns once the running ones finish."""
+        self.stopping.set()
+
+    def execute(self, task):
+        try:
+            return execute(task)
+        except Exception:
+            # recording the outcome failed: the task runs again once its lease is out
+            logger.exception('Task %s could not be recorded', task)
+            return 'lost'
+        finally:
+            # threads outlive tasks, so treat each task like a request
+            close_old_connections()
+
+    def run(self, burst=False):
+        """Run tasks until ``stop()``, or with ``burst`` until none is due.
+
+        Returns the number of tasks per outcome.
+        """
+        outcomes = Counter()
+        purged_at = None
+        running = set()
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='task') as pool:
+            while not self.stopping.is_set():
+                if purged_at is None or timezone.now() - purged_at > timedelta(hours=1):
+                    purge()
+                    purged_at = timezone.now()
+                close_old_connections()
+                free = self.threads - len(running)
+                for task in claim(self.name, free) if free else []:
+                    running.add(pool.submit(self.execute, task))
+                if not running:
+                    if burst:
+                        break
+                    self.stopping.wait(self.poll)
+                    continue
+                done, running = wait(running, timeout=self.poll, return_when=FIRST_COMPLETED)
+                outcomes.update(future.result() for future in done)
+        outcomes.update(future.result() for future in running)
+        return outcomes
+
+
+def run_pending():
+    """Run every due task in this process, for tests and the shell."""
+    return Worker().run(burst=True)
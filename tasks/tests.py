@@ -0,0 +1,79 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Task
+from .queue import claim, enqueue, execute, task
+
+calls = []
+
+
+@task
+def remember(value):
+    calls.append(value)
+
+
+@task(max_attempts=3)
+def fail():
+    raise RuntimeError('try again')
+
+
+@override_settings(TASKS_EAGER=False, TASK_RETRY_DELAY=30, TASK_LEASE_SECONDS=300)
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def make_due(self, task):
+        Task.objects.filter(id=task.id).update(run_after=timezone.now() - timedelta(seconds=1))
+
+    def test_task_runs_once_claimed(self):
+        enqueue(remember, ['hello'])
+        [claimed] = claim('worker', 10)
+        self.assertEqual(execute(claimed), Task.DONE)
+        self.assertEqual(calls, ['hello'])
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+    def test_key_deduplicates(self):
+        first = enqueue(remember, ['a'], key='remember:a')
+        second = enqueue(remember, ['a'], key='remember:a')
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_leased_task_is_not_claimed_twice(self):
+        enqueue(remember, ['once'])
+        self.assertEqual(len(claim('first', 10)), 1)
+        self.assertEqual(claim('second', 10), [])
+
+    def test_expired_lease_goes_to_another_worker(self):
+        enqueue(remember, ['again'])
+        [stale] = claim('dead', 10)
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        [claimed] = claim('alive', 10)
+        self.assertEqual((claimed.worker, claimed.attempts), ('alive', 2))
+        # the first run finishing late does not overwrite the second's outcome
+        execute(stale)
+        self.assertEqual(Task.objects.get().status, Task.RUNNING)
+        self.assertEqual(execute(claimed), Task.DONE)
+
+    def test_failures_are_retried_with_backoff(self):
+        failing = enqueue(fail)
+        delays = []
+        for _ in range(2):
+            [claimed] = claim('worker', 10)
+            now = timezone.now()
+            with mock.patch('tasks.queue.timezone.now', return_value=now), self.assertLogs('tasks.queue'):
+                self.assertEqual(execute(claimed), Task.QUEUED)
+            delays.append((Task.objects.get().run_after - now).total_seconds())
+            self.assertEqual(claim('worker', 10), [])
+            self.make_due(failing)
+        self.assertEqual(delays, [30, 60])
+
+        [claimed] = claim('worker', 10)
+        with self.assertLogs('tasks.queue', 'ERROR'):
+            self.assertEqual(execute(claimed), Task.FAILED)
+        failed = Task.objects.get()
+        self.assertEqual(failed.attempts, 3)
+        self.assertIn('RuntimeError: try again', failed.last_error)
+        self.assertEqual(claim('worker', 10), [])